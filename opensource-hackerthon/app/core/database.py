@@ -1,13 +1,63 @@
-from sqlalchemy import create_engine
+"""DB 엔진과 세션.
+
+DATABASE_URL 로 대상 DB 를 바꿀 수 있다 (기본: 로컬 SQLite 파일, 예: postgresql://user:pw@host/db).
+SQLite 는 연결마다 WAL 저널, synchronous, busy_timeout, mmap_size PRAGMA 를 적용해
+토큰 갱신 같은 쓰기가 읽기를 막지 않게 한다.
+async 경로의 DB 작업(토큰 저장, 메타데이터 조회·저장)은 이 동기 세션을 asyncio.to_thread 로 실행한다.
+"""
+import os
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+load_dotenv()
+
+url = os.getenv("DATABASE_URL", "sqlite:///./myapi.db")
+
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
 
-url = "sqlite:///./myapi.db"
+_url = make_url(url)
+is_sqlite = _url.get_backend_name() == "sqlite"
+# 메모리 DB 는 연결 하나를 공유하는 풀을 쓰므로 크기 설정을 넘기지 않음
+_sqlite_memory = is_sqlite and _url.database in (None, "", ":memory:")
 
-engine = create_engine(
-    url, connect_args={"check_same_thread": False}
-)
+
+def _engine_kwargs() -> dict:
+    if is_sqlite:
+        kw = {"connect_args": {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}}
+        if _sqlite_memory:
+            return kw
+    else:
+        kw = {"pool_pre_ping": True}
+    kw.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+              pool_timeout=DB_POOL_TIMEOUT, pool_recycle=DB_POOL_RECYCLE)
+    return kw
+
+
+def _sqlite_pragmas(dbapi_conn, _record) -> None:
+    cur = dbapi_conn.cursor()
+    try:
+        cur.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cur.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cur.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cur.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    finally:
+        cur.close()
+
+
+engine = create_engine(url, **_engine_kwargs())
+if is_sqlite:
+    event.listen(engine, "connect", _sqlite_pragmas)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -19,3 +69,16 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def dispose() -> None:
+    """종료 시 풀의 연결 정리"""
+    engine.dispose()
+
+
+def stats() -> dict:
+    return {
+        "dialect": engine.dialect.name,
+        "pool": engine.pool.status(),
+        "sqlite_journal_mode": SQLITE_JOURNAL_MODE if is_sqlite else None,
+    }
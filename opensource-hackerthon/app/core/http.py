@@ -0,0 +1,89 @@
+"""업스트림별 공용 httpx.AsyncClient 레지스트리.
+
+호출마다 클라이언트를 새로 만들면 매번 TCP/TLS 핸드셰이크를 하게 되므로
+업스트림(Spotify, Last.fm, Deezer, OpenWeather)마다 keep-alive 풀을 하나씩 두고 공유한다.
+FastAPI lifespan 에서 startup()/shutdown() 으로 만들고 닫는다.
+"""
+import os
+import importlib.util
+from typing import Dict, Optional
+import httpx
+
+# h2 패키지가 있을 때만 HTTP/2 사용
+_HTTP2 = importlib.util.find_spec("h2") is not None
+
+
+def _env(name: str, key: str, default):
+    return type(default)(os.getenv(f"{name.upper()}_{key}", str(default)))
+
+
+def _conf(name: str, max_connections: int, max_keepalive: int, timeout: float,
+          connect_timeout: float = 5.0, http2: bool = True) -> Dict:
+    """환경 변수 <NAME>_MAX_CONNECTIONS / _MAX_KEEPALIVE / _HTTP_TIMEOUT 로 덮어쓸 수 있음"""
+    return {
+        "max_connections": _env(name, "MAX_CONNECTIONS", max_connections),
+        "max_keepalive": _env(name, "MAX_KEEPALIVE", max_keepalive),
+        "timeout": _env(name, "HTTP_TIMEOUT", timeout),
+        "connect_timeout": connect_timeout,
+        "http2": http2 and _HTTP2,
+    }
+
+
+UPSTREAMS: Dict[str, Dict] = {
+    "spotify": _conf("spotify", 50, 20, 10.0),
+    "lastfm": _conf("lastfm", 20, 10, 15.0),
+    "deezer": _conf("deezer", 20, 10, 15.0),
+    "openweather": _conf("openweather", 10, 5, 10.0),
+}
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+_created: Dict[str, int] = {}
+
+
+def _build(name: str) -> httpx.AsyncClient:
+    c = UPSTREAMS[name]
+    _created[name] = _created.get(name, 0) + 1
+    return httpx.AsyncClient(
+        http2=c["http2"],
+        timeout=httpx.Timeout(c["timeout"], connect=c["connect_timeout"]),
+        limits=httpx.Limits(
+            max_connections=c["max_connections"],
+            max_keepalive_connections=c["max_keepalive"],
+            keepalive_expiry=60,
+        ),
+    )
+
+
+def client(name: str) -> httpx.AsyncClient:
+    """업스트림 이름으로 공용 클라이언트를 가져옴 (lifespan 밖에서 호출되면 지연 생성)"""
+    c: Optional[httpx.AsyncClient] = _clients.get(name)
+    if c is None or c.is_closed:
+        c = _clients[name] = _build(name)
+    return c
+
+
+async def startup() -> None:
+    for name in UPSTREAMS:
+        client(name)
+
+
+async def shutdown() -> None:
+    clients = list(_clients.values())
+    _clients.clear()
+    for c in clients:
+        try:
+            await c.aclose()
+        except Exception as e:
+            print(f"[http] 클라이언트 종료 실패: {e}")
+
+
+def stats() -> dict:
+    return {
+        name: {
+            "open": name in _clients and not _clients[name].is_closed,
+            "created": _created.get(name, 0),
+            "max_connections": conf["max_connections"],
+            "http2": conf["http2"],
+        }
+        for name, conf in UPSTREAMS.items()
+    }
@@ -0,0 +1,221 @@
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from typing import Dict, Hashable, Optional
+from app.core.cache import TTLCache
+
+
+class TokenBucket:
+    """초당 rate 개, 최대 burst 개까지 모아둘 수 있는 토큰 버킷.
+    토큰을 먼저 예약(음수 허용)하고 부족분만큼 기다리므로 대기 순서가 공정하다.
+    429 Retry-After 를 받으면 penalize() 로 버킷 전체를 그 시간만큼 막는다."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._last = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """토큰 1개를 예약하고 기다려야 할 시간(초)을 반환"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._blocked_until - now)
+
+    def penalize(self, seconds: float) -> None:
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+class RateLimiter:
+    """자격 증명(토큰)별 TokenBucket 모음 + 스로틀 지표"""
+
+    def __init__(self, name: str, rate: float, burst: float, max_retries: int = 3,
+                 backoff_base: float = 0.5, backoff_cap: float = 8.0):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        # 토큰 원문 대신 해시를 키로 사용, 오래 안 쓴 버킷은 자연히 만료
+        self._buckets = TTLCache(maxsize=10000, ttl=3600)
+        self._lock = threading.Lock()
+        self.throttled_seconds = 0.0
+        self.throttled_calls = 0
+        self.responses_429 = 0
+        self.retries = 0
+        self.gave_up = 0
+
+    def bucket(self, credential: str) -> TokenBucket:
+        key = hashlib.sha256((credential or "").encode()).hexdigest()[:24]
+        with self._lock:
+            b = self._buckets.get(key)
+            if b is None:
+                b = TokenBucket(self.rate, self.burst)
+            # 조회할 때마다 TTL 연장
+            self._buckets.set(key, b)
+        return b
+
+    def _record_wait(self, wait: float) -> None:
+        if wait > 0:
+            self.throttled_seconds += wait
+            self.throttled_calls += 1
+
+    def record_backoff(self, seconds: float) -> None:
+        self.throttled_seconds += seconds
+
+    def acquire(self, credential: str) -> None:
+        wait = self.bucket(credential).reserve()
+        self._record_wait(wait)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, credential: str) -> None:
+        wait = self.bucket(credential).reserve()
+        self._record_wait(wait)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def on_429(self, credential: str, retry_after: Optional[float], attempt: int) -> Optional[float]:
+        """429 응답 처리. 재시도하면 재시도 전에 쉴 시간(초), 포기하면 None"""
+        self.responses_429 += 1
+        if attempt >= self.max_retries:
+            self.gave_up += 1
+            return None
+        self.retries += 1
+        if retry_after is not None:
+            # 같은 자격 증명을 쓰는 모든 호출이 Retry-After 동안 대기
+            self.bucket(credential).penalize(retry_after)
+            # 동시에 막힌 호출들이 같은 순간 몰리지 않도록 지터 추가
+            return retry_after + random.uniform(0, min(1.0, retry_after * 0.2 + 0.1))
+        # Retry-After 가 없으면 full-jitter 지수 백오프
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+
+    def stats(self) -> dict:
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "buckets": len(self._buckets),
+            "throttled_seconds": round(self.throttled_seconds, 3),
+            "throttled_calls": self.throttled_calls,
+            "responses_429": self.responses_429,
+            "retries": self.retries,
+            "gave_up": self.gave_up,
+        }
+
+
+class AsyncPriorityScheduler:
+    """프로세스 전체 공용 비동기 호출 스케줄러.
+    TokenBucket 속도로 한 번에 하나씩 대기자를 깨우며, 우선순위(숫자가 작을수록 먼저)가 높은 큐부터,
+    같은 우선순위 안에서는 flow(요청) 별로 번갈아 꺼내 한 요청이 큐를 독점하지 못하게 한다."""
+
+    WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0)
+
+    def __init__(self, name: str, rate: float, burst: float):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self._queues: Dict[int, "OrderedDict[Hashable, deque]"] = {}
+        self._depth = 0
+        self._task: Optional[asyncio.Task] = None
+        self.max_depth = 0
+        self.dispatched = 0
+        self.penalties = 0
+        self._hist: Dict[int, list] = {}
+
+    async def acquire(self, priority: int = 1, flow: Hashable = None) -> None:
+        fut = asyncio.get_running_loop().create_future()
+        t0 = time.monotonic()
+        self._queues.setdefault(priority, OrderedDict()).setdefault(flow, deque()).append(fut)
+        self._depth += 1
+        self.max_depth = max(self.max_depth, self._depth)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._dispatch())
+        try:
+            await fut
+        except asyncio.CancelledError:
+            self._discard(priority, flow, fut)
+            raise
+        self._observe(priority, time.monotonic() - t0)
+
+    def _discard(self, priority: int, flow: Hashable, fut: asyncio.Future) -> None:
+        """차례가 오기 전에 취소된 대기자를 큐에서 뺌"""
+        flows = self._queues.get(priority)
+        q = flows.get(flow) if flows else None
+        if q is None or fut not in q:
+            return
+        q.remove(fut)
+        self._depth -= 1
+        if not q:
+            del flows[flow]
+        if not flows:
+            del self._queues[priority]
+
+    def penalize(self, seconds: float) -> None:
+        """업스트림이 속도 제한 오류를 보냈을 때 모든 호출을 seconds 동안 멈춤"""
+        self.penalties += 1
+        self.bucket.penalize(seconds)
+
+    def _pop(self) -> Optional[asyncio.Future]:
+        for prio in sorted(self._queues):
+            flows = self._queues[prio]
+            flow, q = flows.popitem(last=False)
+            fut = q.popleft()
+            self._depth -= 1
+            if q:
+                flows[flow] = q  # 라운드 로빈: 이 flow 는 맨 뒤로
+            if not flows:
+                del self._queues[prio]
+            return fut
+        return None
+
+    async def _dispatch(self) -> None:
+        while self._depth > 0:
+            wait = self.bucket.reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            # 기다리는 동안 들어온 더 높은 우선순위 호출이 먼저 나감
+            fut = self._pop()
+            if fut is None:
+                # 기다리는 동안 모두 취소됨
+                break
+            if not fut.done():
+                fut.set_result(None)
+            self.dispatched += 1
+
+    def _observe(self, priority: int, waited: float) -> None:
+        h = self._hist.setdefault(priority, [0] * (len(self.WAIT_BUCKETS) + 1))
+        h[bisect_left(self.WAIT_BUCKETS, waited)] += 1
+
+    def stats(self) -> dict:
+        labels = [f"<={b}s" for b in self.WAIT_BUCKETS] + [f">{self.WAIT_BUCKETS[-1]}s"]
+        return {
+            "rate": self.bucket.rate,
+            "burst": self.bucket.burst,
+            "queue_depth": self._depth,
+            "queue_depth_by_priority": {p: sum(len(q) for q in flows.values()) for p, flows in self._queues.items()},
+            "max_queue_depth": self.max_depth,
+            "dispatched": self.dispatched,
+            "penalties": self.penalties,
+            "wait_histogram": {p: dict(zip(labels, h)) for p, h in sorted(self._hist.items())},
+        }
+
+
+def retry_after_seconds(headers) -> Optional[float]:
+    v = headers.get("Retry-After")
+    if not v:
+        return None
+    try:
+        return max(0.0, float(v))
+    except ValueError:
+        return None
@@ -0,0 +1,85 @@
+"""Server-Sent Events 응답 도우미.
+
+파이프라인 함수에 emit(event, data) 콜백을 넘겨 진행 상황과 결과를 생기는 대로 내보낸다.
+작업이 끝나면 반환값을 "done" 이벤트로, 예외는 "error" 이벤트로 보낸다.
+클라이언트가 연결을 끊으면 작업을 취소한다.
+로그인 사용자가 필요한 작업은 stream_for_user 로 실행한다. 요청 스코프 세션(Depends(get_db))은
+응답이 시작된 뒤의 수명이 보장되지 않으므로, 작업 안에서 전용 세션을 열고 사용자를 다시 읽는다.
+"""
+import json
+import asyncio
+from typing import Any, Awaitable, Callable
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from app.core.database import SessionLocal
+from app.models.user import User
+
+Emit = Callable[[str, Any], None]
+
+# 이벤트가 한동안 없으면 프록시가 연결을 끊지 않도록 주석 줄 전송
+SSE_KEEPALIVE = 15.0
+
+
+def format_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _error_payload(exc: BaseException) -> dict:
+    if isinstance(exc, HTTPException):
+        return {"status": exc.status_code, "detail": exc.detail}
+    return {"status": 500, "detail": f"Internal error: {exc!r}"}
+
+
+def stream(run: Callable[[Emit], Awaitable[Any]]) -> StreamingResponse:
+    """run(emit) 을 실행하면서 emit 된 이벤트를 text/event-stream 으로 흘려보냄"""
+    queue: asyncio.Queue = asyncio.Queue()
+
+    def emit(event: str, data: Any) -> None:
+        queue.put_nowait((event, data))
+
+    async def gen():
+        task = asyncio.ensure_future(run(emit))
+        # 작업이 끝나면 그때까지 쌓인 이벤트 뒤에 종료 표시
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if item is None:
+                    break
+                yield format_event(*item)
+            if task.cancelled():
+                return
+            exc = task.exception()
+            if exc is not None:
+                print(f"[sse] 스트림 작업 오류: {exc!r}")
+                yield format_event("error", _error_payload(exc))
+            else:
+                yield format_event("done", task.result())
+        finally:
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(
+        gen(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def stream_for_user(user_id: int, run: Callable[[User, Any, Emit], Awaitable[Any]]) -> StreamingResponse:
+    """전용 DB 세션에서 사용자를 다시 읽어 run(u, db, emit) 을 스트림으로 실행 (세션은 작업이 끝나면 닫음)"""
+    async def task(emit: Emit) -> Any:
+        db = SessionLocal()
+        try:
+            u = await asyncio.to_thread(db.get, User, user_id)
+            if u is None:
+                raise HTTPException(401, "로그인이 필요합니다")
+            return await run(u, db, emit)
+        finally:
+            db.close()
+
+    return stream(task)
@@ -1,10 +1,28 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse
 from app.routers import user_router, weather_router
 from app.routers import lastfm_router, podcast_router
+from app.core import http, database
+from app.services import weather, spotify, track_meta, deezer_cache, lastfm, token_manager, token_scheduler, mood_engine, mood_pool, app_token, episode_index
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await http.startup()
+    token_scheduler.start()
+    mood_pool.start()
+    episode_index.start()
+    yield
+    await episode_index.stop()
+    await mood_pool.stop()
+    await token_scheduler.stop()
+    await http.shutdown()
+    await database.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
 templates = Jinja2Templates(directory="templates")
 
 from app.core.database import Base, engine
@@ -18,6 +36,25 @@ def main_page(request: Request):
 def weather_page(request: Request):
     return templates.TemplateResponse("weather.html", {"request": request})
 
+@app.get("/stats")
+def stats():
+    """캐시 등 내부 상태 지표"""
+    return {
+        "weather_cache": weather.cache_stats(),
+        "mood_rules": mood_engine.stats(),
+        "mood_pool": mood_pool.stats(),
+        "app_token": app_token.stats(),
+        "podcast_episodes": episode_index.stats(),
+        "track_meta_cache": track_meta.stats(),
+        "deezer_cache": deezer_cache.stats(),
+        "lastfm_cache": lastfm.stats(),
+        "spotify_ratelimit": spotify.limiter.stats(),
+        "spotify_tokens": token_manager.stats(),
+        "token_scheduler": token_scheduler.stats(),
+        "http_clients": http.stats(),
+        "database": database.stats(),
+    }
+
 
 app.include_router(user_router.router)
 app.include_router(weather_router.router)
@@ -0,0 +1,40 @@
+from app.core.database import Base
+from sqlalchemy import Column, Integer, String, Text, Boolean
+
+# Spotify / Last.fm / Deezer 메타데이터 영구 저장소. updated_at 은 epoch 초 (신선도 판단용)
+
+class TrackMeta(Base):
+    __tablename__ = "track_meta"
+    track_id = Column(String, primary_key=True)
+    market = Column(String, primary_key=True)
+    name = Column(String, nullable=False)
+    artists = Column(String, nullable=False)
+    album = Column(String, nullable=True)
+    album_image = Column(Text, nullable=True)
+    url = Column(Text, nullable=True)
+    popularity = Column(Integer, nullable=True)
+    updated_at = Column(Integer, nullable=False, index=True)
+
+
+class ArtistMeta(Base):
+    __tablename__ = "artist_meta"
+    artist_id = Column(String, primary_key=True)
+    name = Column(String, nullable=False)
+    updated_at = Column(Integer, nullable=False)
+
+
+class LastfmTag(Base):
+    __tablename__ = "lastfm_tag"
+    artist = Column(String, primary_key=True)  # 정규화된 값 (소문자, 공백 정리)
+    track = Column(String, primary_key=True)
+    tags = Column(Text, nullable=False)  # JSON 배열
+    updated_at = Column(Integer, nullable=False)
+
+
+class DeezerMatch(Base):
+    __tablename__ = "deezer_match"
+    artist = Column(String, primary_key=True)  # 정규화된 값 (소문자, 공백 정리)
+    track = Column(String, primary_key=True)
+    found = Column(Boolean, nullable=False)
+    data = Column(Text, nullable=True)  # 매칭 결과 JSON (found=False 면 NULL)
+    updated_at = Column(Integer, nullable=False, index=True)
@@ -1,48 +1,28 @@
 import os
 import re
-import time
-import base64
+import asyncio
 import random
 import hashlib
-from typing import List, Dict, Optional
-import httpx
+from typing import Any, List, Dict, Optional, Tuple, Awaitable, Callable, TypeVar
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel, Field
-from collections import Counter
+from collections import Counter, deque
 from dotenv import load_dotenv
 from app.routers.user_router import current_user
 from app.core.database import get_db
+from app.core import http, sse
+from app.services import spotify_async, token_manager, deezer_cache, app_token, lastfm
+from app.services.lastfm import LASTFM_API_KEY, PRIORITY_LOW, lf_track_tags, lf_similar_tracks, lf_top_by_tag
 
 load_dotenv()
 
-LASTFM_API_KEY = os.getenv("LASTFM_API_KEY", "")
-SPOTIFY_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID", "")
-SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET", "")
-SPOTIFY_API = "https://api.spotify.com/v1"
-SPOTIFY_TOKEN_URL = "https://accounts.spotify.com/api/token"
+T = TypeVar("T")
 
-_token = {"val": None, "exp": 0}
+SPOTIFY_API = "https://api.spotify.com/v1"
 
 router = APIRouter(prefix="/lastfm", tags=["lastfm"])
 
 # ====== Spotify (선택) ======
-def spotify_token() -> str:
-    if not SPOTIFY_CLIENT_ID or not SPOTIFY_CLIENT_SECRET:
-        raise RuntimeError("No Spotify credentials")
-    now = time.time()
-    if _token["val"] and _token["exp"] - now > 20:
-        return _token["val"]
-    auth = base64.b64encode(f"{SPOTIFY_CLIENT_ID}:{SPOTIFY_CLIENT_SECRET}".encode()).decode()
-    with httpx.Client(timeout=15) as c:
-        r = c.post(SPOTIFY_TOKEN_URL, data={"grant_type": "client_credentials"},
-                   headers={"Authorization": f"Basic {auth}"})
-        r.raise_for_status()
-        js = r.json()
-    _token["val"] = js["access_token"]
-    _token["exp"] = now + js.get("expires_in", 3600)
-    return _token["val"]
-
-
 def parse_playlist_id(url: str) -> str:
     m = re.search(r"(playlist/|spotify:playlist:)([A-Za-z0-9]+)", url)
     if not m:
@@ -56,7 +36,7 @@ async def get_spotify_tracks_text(playlist_url: str) -> List[Dict]:
     try:
         pid = parse_playlist_id(playlist_url)
         print(f"   📝 플레이리스트 ID: {pid}")
-        token = spotify_token()
+        token = await app_token.get_token()
         print(f"   🔑 Spotify 토큰 획득 완료")
     except Exception as e:
         print(f"   ❌ Spotify 접근 실패: {e}")
@@ -66,86 +46,39 @@ async def get_spotify_tracks_text(playlist_url: str) -> List[Dict]:
     url = f"{SPOTIFY_API}/playlists/{pid}/tracks?limit=100"
     page_count = 0
     
-    async with httpx.AsyncClient(timeout=20) as c:
-        while url:
-            page_count += 1
-            print(f"   📄 페이지 {page_count} 로딩 중...")
-            
-            r = await c.get(url, headers={"Authorization": f"Bearer {token}"})
-            if r.status_code == 404:
-                print(f"   ❌ 플레이리스트를 찾을 수 없습니다 (404)")
-                break
-            r.raise_for_status()
-            js = r.json()
-            
-            items_in_page = 0
-            for it in js.get("items", []):
-                t = (it or {}).get("track") or {}
-                if t.get("type") == "track" and not t.get("is_local", False):
-                    name = t.get("name")
-                    arts = [a["name"] for a in t.get("artists", [])]
-                    if name and arts:
-                        out.append({"name": name, "artists": arts})
-                        items_in_page += 1
-            
-            print(f"      ✓ {items_in_page}개 트랙 추출")
-            url = js.get("next")
-            
-            if len(out) >= 200:  # 최대 200곡까지만
-                print(f"   ⚠️  최대 곡 수 도달 (200개)")
-                break
+    # 앱 토큰 버킷으로 속도 제한, 429 는 Retry-After 후 재시도
+    while url:
+        page_count += 1
+        print(f"   📄 페이지 {page_count} 로딩 중...")
+        
+        r = await spotify_async.api_request("GET", url, token)
+        if r.status_code == 404:
+            print(f"   ❌ 플레이리스트를 찾을 수 없습니다 (404)")
+            break
+        r.raise_for_status()
+        js = r.json()
+        
+        items_in_page = 0
+        for it in js.get("items", []):
+            t = (it or {}).get("track") or {}
+            if t.get("type") == "track" and not t.get("is_local", False):
+                name = t.get("name")
+                arts = [a["name"] for a in t.get("artists", [])]
+                if name and arts:
+                    out.append({"name": name, "artists": arts})
+                    items_in_page += 1
+        
+        print(f"      ✓ {items_in_page}개 트랙 추출")
+        url = js.get("next")
+        
+        if len(out) >= 200:  # 최대 200곡까지만
+            print(f"   ⚠️  최대 곡 수 도달 (200개)")
+            break
     
     print(f"   ✅ 총 {len(out)}개 트랙 추출 완료")
     return out
 
 
-# ====== Last.fm ======
-LASTFM = "https://ws.audioscrobbler.com/2.0/"
-
-
-async def lastfm_get(method: str, params: Dict) -> Dict:
-    q = {"method": method, "api_key": LASTFM_API_KEY, "format": "json"}
-    q.update(params)
-    headers = {
-        "User-Agent": "MusicRecommender/1.0",
-        "Accept": "application/json"
-    }
-    async with httpx.AsyncClient(timeout=15) as c:
-        r = await c.get(LASTFM, params=q, headers=headers)
-        r.raise_for_status()
-        return r.json()
-
-
-async def lf_track_tags(artist: str, track: str) -> List[str]:
-    try:
-        js = await lastfm_get("track.getTopTags", {"artist": artist, "track": track})
-        tags = js.get("toptags", {}).get("tag", [])
-        return [t.get("name", "").lower() for t in tags if isinstance(t, dict)]
-    except Exception as e:
-        print(f"[Last.fm] 태그 조회 실패 ({artist} - {track}): {e}")
-        return []
-
-
-async def lf_similar_tracks(artist: str, track: str, limit=20) -> List[Dict]:
-    try:
-        js = await lastfm_get("track.getSimilar", {"artist": artist, "track": track, "limit": limit})
-        return [{"name": it.get("name"), "artist": it.get("artist", {}).get("name")}
-                for it in js.get("similartracks", {}).get("track", []) if it.get("name")]
-    except Exception as e:
-        print(f"[Last.fm] 유사 트랙 조회 실패 ({artist} - {track}): {e}")
-        return []
-
-
-async def lf_top_by_tag(tag: str, limit=30) -> List[Dict]:
-    try:
-        js = await lastfm_get("tag.getTopTracks", {"tag": tag, "limit": limit})
-        return [{"name": it.get("name"), "artist": it.get("artist", {}).get("name")}
-                for it in js.get("tracks", {}).get("track", []) if it.get("name")]
-    except Exception as e:
-        print(f"[Last.fm] 태그별 트랙 조회 실패 ({tag}): {e}")
-        return []
-
-
 # ====== 개선된 무드 매핑 ======
 # 1. 감정 축
 # 긍정적/밝은 분위기
@@ -248,63 +181,63 @@ GENRE_TO_MOOD = {
 }
 
 
-def invert_tagset(tags: List[str]) -> List[str]:
-    """태그를 분석해서 주된 분위기의 반대 생성 - 10가지 축 지원"""
-    s = set(t.lower() for t in tags)
-    
-    print(f"   🔍 태그 분석 (총 {len(s)}개): {', '.join(list(s)[:15])}")
-    
-    # 모든 카테고리별 점수 계산
-    scores = {
-        "bright": len(s & BRIGHT_HAPPY),
-        "dark": len(s & DARK_SAD),
-        "high_energy": len(s & HIGH_ENERGY),
-        "low_energy": len(s & LOW_ENERGY),
-        "danceable": len(s & DANCEABLE),
-        "calm": len(s & CALM),
-        "summer": len(s & SUMMER),
-        "winter": len(s & WINTER),
-        "spring": len(s & SPRING),
-        "autumn": len(s & AUTUMN),
-        "morning": len(s & MORNING),
-        "night": len(s & NIGHT),
-        "evening": len(s & EVENING),
-        "workout": len(s & WORKOUT),
-        "study": len(s & STUDY),
-        "sleep": len(s & SLEEP),
-        "party": len(s & PARTY),
-        "romantic": len(s & ROMANTIC),
-        "nostalgic": len(s & NOSTALGIC),
-        "dreamy": len(s & DREAMY),
-        "intense": len(s & INTENSE),
-        "kpop": len(s & KPOP),
-        "jpop": len(s & JPOP),
-        "latin": len(s & LATIN),
-        "hiphop": len(s & HIPHOP),
-        "vocal": len(s & VOCAL),
-        "instrumental": len(s & INSTRUMENTAL),
-    }
-    
-    # 장르 힌트 추가
-    genre_hints = {"calm": 0, "energetic": 0, "dark": 0, "bright": 0}
-    for tag in s:
-        if tag in GENRE_TO_MOOD:
-            mood = GENRE_TO_MOOD[tag]
-            genre_hints[mood] += 1
-    
-    if any(genre_hints.values()):
-        scores["calm"] += genre_hints["calm"]
-        scores["danceable"] += genre_hints["energetic"]
-        scores["dark"] += genre_hints["dark"]
-        scores["bright"] += genre_hints["bright"]
-    
-    # 점수 출력 (의미있는 것만)
-    print(f"   📊 분위기 점수:")
-    meaningful = {k: v for k, v in scores.items() if v > 0}
-    if meaningful:
-        for k, v in sorted(meaningful.items(), key=lambda x: x[1], reverse=True)[:8]:
-            print(f"      {k}: {v}")
-    
+# 태그 → 축 역색인 (import 시 한 번만 생성). 축 순서는 점수 출력 순서와 같음
+MOOD_AXES = [
+    ("bright", BRIGHT_HAPPY), ("dark", DARK_SAD),
+    ("high_energy", HIGH_ENERGY), ("low_energy", LOW_ENERGY),
+    ("danceable", DANCEABLE), ("calm", CALM),
+    ("summer", SUMMER), ("winter", WINTER), ("spring", SPRING), ("autumn", AUTUMN),
+    ("morning", MORNING), ("night", NIGHT), ("evening", EVENING),
+    ("workout", WORKOUT), ("study", STUDY), ("sleep", SLEEP), ("party", PARTY),
+    ("romantic", ROMANTIC), ("nostalgic", NOSTALGIC), ("dreamy", DREAMY), ("intense", INTENSE),
+    ("kpop", KPOP), ("jpop", JPOP), ("latin", LATIN), ("hiphop", HIPHOP),
+    ("vocal", VOCAL), ("instrumental", INSTRUMENTAL),
+]
+AXIS_NAMES = [name for name, _ in MOOD_AXES]
+# 장르 힌트가 더해지는 축 (energetic 장르는 danceable 점수로)
+_GENRE_HINT_AXIS = {"calm": "calm", "energetic": "danceable", "dark": "dark", "bright": "bright"}
+
+
+def _build_axis_index() -> Dict[str, Tuple[int, ...]]:
+    pos = {name: i for i, name in enumerate(AXIS_NAMES)}
+    index: Dict[str, List[int]] = {}
+    for name, tagset in MOOD_AXES:
+        for tag in tagset:
+            index.setdefault(tag, []).append(pos[name])
+    for tag, mood in GENRE_TO_MOOD.items():
+        index.setdefault(tag, []).append(pos[_GENRE_HINT_AXIS[mood]])
+    return {tag: tuple(axes) for tag, axes in index.items()}
+
+
+_AXIS_INDEX = _build_axis_index()
+
+
+def score_tags(tags) -> List[int]:
+    """태그 목록의 축별 점수 (AXIS_NAMES 순서). 중복 태그는 한 번만 센다"""
+    scores = [0] * len(AXIS_NAMES)
+    get = _AXIS_INDEX.get
+    for tag in {t.lower() for t in tags}:
+        for i in get(tag, ()):
+            scores[i] += 1
+    return scores
+
+
+def score_tagsets(tag_lists: List[List[str]]) -> List[List[int]]:
+    """여러 태그 목록을 한 번에 점수화 (오프라인 평가용)"""
+    return [score_tags(tags) for tags in tag_lists]
+
+
+def invert_tagsets(tag_lists: List[List[str]]) -> List[Tuple[str, List[str]]]:
+    """여러 태그 목록 각각의 (판단 이유, 반대 태그). 로그 출력 없음"""
+    out = []
+    for tags in tag_lists:
+        s = {t.lower() for t in tags}
+        out.append(_choose_opposite(dict(zip(AXIS_NAMES, score_tags(s))), s))
+    return out
+
+
+def _choose_opposite(scores: Dict[str, int], s: set) -> Tuple[str, List[str]]:
+    """축 점수로 우선순위에 따라 (판단 이유, 반대 태그)를 결정"""
     opposite = []
     reason = ""
     
@@ -472,6 +405,27 @@ def invert_tagset(tags: List[str]) -> List[str]:
         else:
             opposite = ["sad", "melancholy", "acoustic", "piano", "ballad"]
     
+    return reason, opposite
+
+
+def invert_tagset(tags: List[str]) -> List[str]:
+    """태그를 분석해서 주된 분위기의 반대 생성 - 10가지 축 지원"""
+    s = set(t.lower() for t in tags)
+    
+    print(f"   🔍 태그 분석 (총 {len(s)}개): {', '.join(list(s)[:15])}")
+    
+    # 모든 카테고리별 점수 계산 (장르 힌트 포함, 역색인 한 번 순회)
+    scores = dict(zip(AXIS_NAMES, score_tags(s)))
+    
+    # 점수 출력 (의미있는 것만)
+    print(f"   📊 분위기 점수:")
+    meaningful = {k: v for k, v in scores.items() if v > 0}
+    if meaningful:
+        for k, v in sorted(meaningful.items(), key=lambda x: x[1], reverse=True)[:8]:
+            print(f"      {k}: {v}")
+    
+    reason, opposite = _choose_opposite(scores, s)
+    
     print(f"   ✅ {reason}")
     print(f"   🎯 최종 반대 태그 ({len(opposite)}개): {', '.join(opposite[:8])}")
     
@@ -480,35 +434,107 @@ def invert_tagset(tags: List[str]) -> List[str]:
 
 # ====== Deezer ======
 async def deezer_search(artist: str, track: str) -> Optional[Dict]:
+    # 같은 곡은 캐시에서 (못 찾은 곡도 '매칭 없음'으로 캐시됨)
+    hit, cached = deezer_cache.get(artist, track)
+    if hit:
+        return cached
     q = f'artist:"{artist}" track:"{track}"'
     try:
-        async with httpx.AsyncClient(timeout=15) as c:
-            r = await c.get("https://api.deezer.com/search", params={"q": q})
-            if r.status_code != 200:
-                return None
-            data = r.json().get("data", [])
-            if not data:
-                return None
-            d = data[0]
-            
-            # 매칭 정확도 체크 (옵션)
-            matched_artist = d.get("artist", {}).get("name", "")
-            matched_track = d.get("title", "")
-            
-            return {
-                "name": matched_track,
-                "artists": [matched_artist],
-                "preview_url": d.get("preview"),
-                "external_url": d.get("link"),
-                "album": {
-                    "name": d.get("album", {}).get("title"),
-                    "image": f'https://e-cdns-images.dzcdn.net/images/cover/{d.get("album", {}).get("md5_image")}/250x250-000000-80-0-0.jpg' if d.get("album") else None
-                }
+        r = await http.client("deezer").get("https://api.deezer.com/search", params={"q": q})
+        if r.status_code != 200:
+            return None
+        js = r.json()
+        if js.get("error"):
+            # 쿼터 초과 등 오류 응답은 캐시하지 않음
+            return None
+        data = js.get("data", [])
+        if not data:
+            deezer_cache.put(artist, track, None)
+            return None
+        d = data[0]
+        
+        # 매칭 정확도 체크 (옵션)
+        matched_artist = d.get("artist", {}).get("name", "")
+        matched_track = d.get("title", "")
+        
+        match = {
+            "name": matched_track,
+            "artists": [matched_artist],
+            "preview_url": d.get("preview"),
+            "external_url": d.get("link"),
+            "album": {
+                "name": d.get("album", {}).get("title"),
+                "image": f'https://e-cdns-images.dzcdn.net/images/cover/{d.get("album", {}).get("md5_image")}/250x250-000000-80-0-0.jpg' if d.get("album") else None
             }
+        }
+        deezer_cache.put(artist, track, match)
+        return match
     except Exception as e:
         return None
 
 
+# 동시에 진행할 Deezer 검색 수
+DEEZER_CONCURRENCY = int(os.getenv("DEEZER_CONCURRENCY", "8"))
+
+
+async def deezer_match_ordered(candidates: List[Dict], limit: int, concurrency: int = None,
+                               on_match: Optional[Callable[[int, Dict], None]] = None) -> Tuple[List[Dict], int, int]:
+    """후보를 앞에서부터 최대 concurrency 개씩 동시에 Deezer 에서 찾는다.
+    결과는 후보 순서대로 확정하므로 순차 처리와 똑같이 '앞에서부터 limit 개'가 나온다.
+    limit 개가 채워지면 더 보내지 않고 진행 중인 검색은 취소한다.
+    on_match(순위, 결과) 는 매칭이 확정될 때마다 (최종 순서대로) 호출된다.
+    반환: (매칭 결과, 성공 수, 실패 수)"""
+    concurrency = max(1, concurrency or DEEZER_CONCURRENCY)
+    seen, uniq = set(), []
+    for it in candidates:
+        key = (it["artist"].lower(), it["name"].lower())
+        if key in seen:
+            continue
+        seen.add(key)
+        uniq.append(it)
+    
+    # 메모리에 없는 후보는 DB 에 저장된 결과를 한 번에 불러옴
+    loaded = await asyncio.to_thread(deezer_cache.load_persisted, [(it["artist"], it["name"]) for it in uniq])
+    if loaded:
+        print(f"   💾 저장된 Deezer 매칭 {loaded}개 로드")
+    
+    out, match_success, match_fail = [], 0, 0
+    window: deque = deque()
+    nxt = 0
+    try:
+        while len(out) < limit and (window or nxt < len(uniq)):
+            while nxt < len(uniq) and len(window) < concurrency:
+                it = uniq[nxt]
+                window.append(asyncio.create_task(deezer_search(it["artist"], it["name"])))
+                nxt += 1
+            
+            idx = nxt - len(window) + 1
+            it = uniq[idx - 1]
+            if idx <= 5 or idx % 10 == 0:
+                print(f"   [{idx}/{min(len(uniq), limit*2)}] 매칭 시도: {it['artist']} - {it['name']}")
+            dz = await window.popleft()
+            if dz:
+                out.append(dz)
+                match_success += 1
+                if on_match:
+                    on_match(len(out) - 1, dz)
+                if idx <= 5:
+                    print(f"      ✓ Deezer 매칭 성공")
+            else:
+                match_fail += 1
+                if idx <= 5:
+                    print(f"      ❌ Deezer에서 찾을 수 없음")
+        if len(out) >= limit:
+            print(f"   ✓ 목표 달성 ({limit}개)")
+    finally:
+        for t in window:
+            t.cancel()
+        if window:
+            await asyncio.gather(*window, return_exceptions=True)
+    await asyncio.to_thread(deezer_cache.flush)
+    return out, match_success, match_fail
+
+
 # ====== 랜덤 결정 ======
 def rng_from(*vals) -> random.Random:
     s = "|".join(str(v) for v in vals)
@@ -517,7 +543,22 @@ def rng_from(*vals) -> random.Random:
 
 
 # ====== 추천 파이프라인 ======
-async def recommend_from_lastfm(url: str, invert: bool, limit: int, variant: int, playlist_name: str = "") -> Dict:
+# 요청 하나가 동시에 보내는 Last.fm 호출 수
+LASTFM_SEED_CONCURRENCY = int(os.getenv("LASTFM_SEED_CONCURRENCY", "6"))
+
+
+async def _gather_limited(sem: asyncio.Semaphore, coros: List[Awaitable[T]]) -> List[T]:
+    """coros 를 sem 한도 안에서 동시에 실행하고 입력 순서대로 결과를 반환"""
+    async def run(c):
+        async with sem:
+            return await c
+    return await asyncio.gather(*(run(c) for c in coros))
+
+
+async def recommend_from_lastfm(url: str, invert: bool, limit: int, variant: int, playlist_name: str = "",
+                                emit: Optional[Callable[[str, Any], None]] = None) -> Dict:
+    """emit(event, data) 가 주어지면 단계별 "progress" 와 Deezer 매칭이 확정된 곡마다 "track" 이벤트를 보낸다"""
+    emit = emit or (lambda event, data: None)
     print(f"\n{'='*70}")
     print(f"🎵 [Last.fm 추천 시작]")
     print(f"   - 플레이리스트 URL: {url}")
@@ -529,11 +570,13 @@ async def recommend_from_lastfm(url: str, invert: bool, limit: int, variant: int
     print(f"{'='*70}\n")
     
     rng = rng_from(url, "inv" if invert else "sim", variant)
+    lastfm.new_flow()
     
     # Step 1: Spotify 플레이리스트 분석
     print(f"[Step 1] Spotify 플레이리스트 분석 중...")
     base_tracks = await get_spotify_tracks_text(url)
     print(f"   ✓ 플레이리스트에서 {len(base_tracks)}개 트랙 추출")
+    emit("progress", {"stage": "playlist", "tracks": len(base_tracks)})
     
     if not base_tracks:
         print(f"   ❌ 플레이리스트가 비어있거나 접근할 수 없습니다")
@@ -554,9 +597,12 @@ async def recommend_from_lastfm(url: str, invert: bool, limit: int, variant: int
     
     collected = []
     used_tags = []  # 사용된 태그를 저장
+    # 이 요청의 Last.fm 호출 단계들이 함께 쓰는 동시 실행 제한
+    sem = asyncio.Semaphore(LASTFM_SEED_CONCURRENCY)
     
     # Step 2: Last.fm 데이터 수집
     print(f"\n[Step 2] Last.fm API 호출 중...")
+    emit("progress", {"stage": "lastfm", "seeds": len(seed_pairs)})
     
     if seed_pairs:
         if not invert:
@@ -565,9 +611,13 @@ async def recommend_from_lastfm(url: str, invert: bool, limit: int, variant: int
             
             # 시드 곡들의 태그도 수집 (표시용)
             print(f"   🏷️  시드 곡 태그 수집 중...")
+            # 태그(처음 3곡)와 유사 트랙 조회를 한꺼번에 동시 실행, 결과는 시드 순서대로 사용
+            tag_results, sim_results = await asyncio.gather(
+                _gather_limited(sem, [lf_track_tags(a, n) for a, n in seed_pairs[:3]]),
+                _gather_limited(sem, [lf_similar_tracks(a, n, limit=50) for a, n in seed_pairs]),
+            )
             seed_tags = []
-            for a, n in seed_pairs[:3]:  # 처음 3곡만 태그 수집
-                track_tags = await lf_track_tags(a, n)
+            for track_tags in tag_results:
                 if track_tags:
                     seed_tags += track_tags[:5]  # 각 곡당 최대 5개 태그
             
@@ -581,9 +631,8 @@ async def recommend_from_lastfm(url: str, invert: bool, limit: int, variant: int
             success_count = 0
             fail_count = 0
             
-            for idx, (a, n) in enumerate(seed_pairs, 1):
+            for idx, ((a, n), sim) in enumerate(zip(seed_pairs, sim_results), 1):
                 print(f"   [{idx}/{len(seed_pairs)}] 검색 중: {a} - {n}")
-                sim = await lf_similar_tracks(a, n, limit=50)
                 
                 if sim:
                     selected = rng.randint(10, 20)
@@ -608,9 +657,9 @@ async def recommend_from_lastfm(url: str, invert: bool, limit: int, variant: int
                 supplement_tags = ["k-pop", "korean", "pop", "indie", "ballad"]
                 rng.shuffle(supplement_tags)
                 
-                for idx, tg in enumerate(supplement_tags[:3], 1):
+                supplement_results = await _gather_limited(sem, [lf_top_by_tag(tg, limit=40, priority=PRIORITY_LOW) for tg in supplement_tags[:3]])
+                for idx, (tg, top) in enumerate(zip(supplement_tags[:3], supplement_results), 1):
                     print(f"   [보완 {idx}/3] '{tg}' 태그로 검색 중...")
-                    top = await lf_top_by_tag(tg, limit=40)
                     
                     if top:
                         selected = rng.randint(15, 25)
@@ -686,9 +735,9 @@ async def recommend_from_lastfm(url: str, invert: bool, limit: int, variant: int
             success_count = 0
             fail_count = 0
             
-            for idx, (a, n) in enumerate(seed_pairs, 1):
+            tag_results = await _gather_limited(sem, [lf_track_tags(a, n) for a, n in seed_pairs])
+            for idx, ((a, n), track_tags) in enumerate(zip(seed_pairs, tag_results), 1):
                 print(f"   [{idx}/{len(seed_pairs)}] 태그 분석 중: {a} - {n}")
-                track_tags = await lf_track_tags(a, n)
                 
                 if track_tags:
                     tags += track_tags
@@ -712,9 +761,9 @@ async def recommend_from_lastfm(url: str, invert: bool, limit: int, variant: int
                 used_tags = selected_tags.copy()  # 사용된 태그 저장
                 print(f"   🎯 선택된 태그 ({len(selected_tags)}개): {', '.join(selected_tags)}")
                 
-                for idx, tg in enumerate(selected_tags, 1):
+                top_results = await _gather_limited(sem, [lf_top_by_tag(tg, limit=50) for tg in selected_tags])
+                for idx, (tg, top) in enumerate(zip(selected_tags, top_results), 1):
                     print(f"   [{idx}/{len(selected_tags)}] '{tg}' 태그로 검색 중...")
-                    top = await lf_top_by_tag(tg, limit=50)
                     
                     if top:
                         selected = rng.randint(10, 20)
@@ -763,9 +812,9 @@ async def recommend_from_lastfm(url: str, invert: bool, limit: int, variant: int
                 used_tags = selected_tags.copy()  # 사용된 태그 저장
                 print(f"   🎯 대체 태그 ({len(selected_tags)}개): {', '.join(selected_tags)}")
                 
-                for idx, tg in enumerate(selected_tags, 1):
+                top_results = await _gather_limited(sem, [lf_top_by_tag(tg, limit=60) for tg in selected_tags])
+                for idx, (tg, top) in enumerate(zip(selected_tags, top_results), 1):
                     print(f"   [{idx}/{len(selected_tags)}] '{tg}' 태그로 검색 중...")
-                    top = await lf_top_by_tag(tg, limit=60)
                     
                     if top:
                         selected = rng.randint(12, 20)
@@ -782,9 +831,9 @@ async def recommend_from_lastfm(url: str, invert: bool, limit: int, variant: int
         selected_tags = tags_src[:rng.randint(3, 5)]
         used_tags = selected_tags.copy()  # 사용된 태그 저장
         
-        for tg in selected_tags:
+        top_results = await _gather_limited(sem, [lf_top_by_tag(tg, limit=60) for tg in selected_tags])
+        for tg, top in zip(selected_tags, top_results):
             print(f"   검색 중: '{tg}' 태그")
-            top = await lf_top_by_tag(tg, limit=60)
             if top:
                 selected = rng.randint(12, 24)
                 rng.shuffle(top)
@@ -795,35 +844,12 @@ async def recommend_from_lastfm(url: str, invert: bool, limit: int, variant: int
     
     # Step 3: Deezer 매칭
     print(f"\n[Step 3] Deezer 음원 매칭 중...")
-    seen, out = set(), []
     rng.shuffle(collected)
-    
-    match_success = 0
-    match_fail = 0
-    
-    for idx, it in enumerate(collected, 1):
-        if len(out) >= limit:
-            print(f"   ✓ 목표 달성 ({limit}개)")
-            break
-            
-        key = (it["artist"].lower(), it["name"].lower())
-        if key in seen:
-            continue
-        seen.add(key)
-        
-        if idx <= 5 or idx % 10 == 0:
-            print(f"   [{idx}/{min(len(collected), limit*2)}] 매칭 시도: {it['artist']} - {it['name']}")
-        
-        dz = await deezer_search(it["artist"], it["name"])
-        if dz:
-            out.append(dz)
-            match_success += 1
-            if idx <= 5:
-                print(f"      ✓ Deezer 매칭 성공")
-        else:
-            match_fail += 1
-            if idx <= 5:
-                print(f"      ❌ Deezer에서 찾을 수 없음")
+    emit("progress", {"stage": "deezer", "candidates": len(collected), "used_tags": used_tags})
+    out, match_success, match_fail = await deezer_match_ordered(
+        collected, limit,
+        on_match=lambda rank, dz: emit("track", {"rank": rank, "track": dz}),
+    )
     
     print(f"\n   📊 Deezer 매칭 결과:")
     print(f"      매칭 성공: {match_success}개")
@@ -852,56 +878,22 @@ def health():
     return {"ok": True, "lastfm": bool(LASTFM_API_KEY)}
 
 
-@router.post("/recommend")
-async def recommend(req: RecommendRequest, u = Depends(current_user), db = Depends(get_db)):
-    if not LASTFM_API_KEY:
-        raise HTTPException(500, "LASTFM_API_KEY 미설정")
-    
-    # 로그인 필요
-    if not u:
-        raise HTTPException(401, "로그인이 필요합니다")
-    
+async def _lastfm_recommendation(req: RecommendRequest, u, db, emit=None) -> Dict:
+    """플레이리스트 이름 검색 → Last.fm 추천. emit 이 있으면 진행 상황과 곡을 이벤트로 보냄"""
     try:
-        from app.services.spotify import playlist_search, playlist_tracks
-        from app.services import user as user_service
+        from app.services.spotify_async import playlist_search
         import random
         
-        access_token = u.access_token
-        
         # 1. 플레이리스트 이름으로 검색 (토큰 갱신 로직 포함)
         print(f"\n[Last.fm 추천] 플레이리스트 검색: '{req.playlist_name}'")
         
         try:
-            search_results = playlist_search(access_token, req.playlist_name, market="KR", limit=8)
-        except Exception as e:
-            error_str = str(e)
-            # 401 에러이고 refresh_token이 있으면 갱신 시도
-            if "401" in error_str and u.refresh_token:
-                print(f"[lastfm_router] Token expired, attempting refresh...")
-                try:
-                    new_token_data = user_service.refresh_access_token(u.refresh_token)
-                    access_token = new_token_data.get("access_token")
-                    
-                    if not access_token:
-                        raise HTTPException(401, "토큰 갱신 실패. 다시 로그인해주세요.")
-                    
-                    # DB 업데이트
-                    u.access_token = access_token
-                    if new_token_data.get("refresh_token"):
-                        u.refresh_token = new_token_data["refresh_token"]
-                    db.add(u)
-                    db.commit()
-                    
-                    print(f"[lastfm_router] Token refreshed successfully, retrying search...")
-                    
-                    # 갱신된 토큰으로 재시도
-                    search_results = playlist_search(access_token, req.playlist_name, market="KR", limit=8)
-                    
-                except Exception as refresh_error:
-                    print(f"[lastfm_router] Refresh failed: {refresh_error}")
-                    raise HTTPException(401, "토큰이 만료되었습니다. 로그아웃 후 다시 로그인해주세요.")
-            else:
-                raise
+            search_results = await token_manager.with_token(
+                u, db, lambda tok: playlist_search(tok, req.playlist_name, market="KR", limit=8)
+            )
+        except token_manager.TokenRefreshError as refresh_error:
+            print(f"[lastfm_router] Refresh failed: {refresh_error}")
+            raise HTTPException(401, "토큰이 만료되었습니다. 로그아웃 후 다시 로그인해주세요.")
         
         if not search_results:
             raise HTTPException(404, f"'{req.playlist_name}' 플레이리스트를 찾을 수 없습니다")
@@ -924,9 +916,11 @@ async def recommend(req: RecommendRequest, u = Depends(current_user), db = Depen
         
         # 2. 플레이리스트의 Spotify URL 구성
         playlist_url = f"https://open.spotify.com/playlist/{playlist_id}"
+        if emit:
+            emit("source_playlist", {"id": playlist_id, "name": playlist_name_found, "url": playlist_url})
         
         # 3. 기존 Last.fm 추천 로직 사용 (플레이리스트 이름 전달)
-        data = await recommend_from_lastfm(playlist_url, req.invert, req.limit, req.variant, playlist_name_found)
+        data = await recommend_from_lastfm(playlist_url, req.invert, req.limit, req.variant, playlist_name_found, emit=emit)
         
         if not data["tracks"]:
             raise HTTPException(502, "후보를 찾지 못했습니다.")
@@ -946,6 +940,34 @@ async def recommend(req: RecommendRequest, u = Depends(current_user), db = Depen
         print(f"[Last.fm 추천] 오류: {e}")
         raise HTTPException(500, f"Internal error: {e!r}")
 
+
+def _check_recommend_ready(u) -> None:
+    if not LASTFM_API_KEY:
+        raise HTTPException(500, "LASTFM_API_KEY 미설정")
+    
+    # 로그인 필요
+    if not u:
+        raise HTTPException(401, "로그인이 필요합니다")
+
+
+@router.post("/recommend")
+async def recommend(req: RecommendRequest, u = Depends(current_user), db = Depends(get_db)):
+    _check_recommend_ready(u)
+    return await _lastfm_recommendation(req, u, db)
+
+
+@router.post("/recommend/stream")
+async def recommend_stream(req: RecommendRequest, u = Depends(current_user)):
+    """
+    /lastfm/recommend 의 SSE 버전
+    - source_playlist: 선택된 원본 플레이리스트
+    - progress: 파이프라인 단계
+    - track: Deezer 매칭이 확정된 곡 (최종 순서대로)
+    - done: /lastfm/recommend 와 같은 전체 응답 / error: {status, detail}
+    """
+    _check_recommend_ready(u)
+    return sse.stream_for_user(u.id, lambda u, db, emit: _lastfm_recommendation(req, u, db, emit))
+
 # 플레이리스트 저장 요청 모델
 class SaveLastfmPlaylistRequest(BaseModel):
     track_names: List[Dict[str, str]]  # [{"name": "song", "artist": "artist"}]
@@ -969,16 +991,14 @@ async def save_lastfm_playlist(
     if not request.track_names:
         raise HTTPException(400, "트랙 정보가 필요합니다")
     
-    access_token = u.access_token
-    
     print(f"\n[Last.fm 플레이리스트 저장 시작]")
     print(f"  - 플레이리스트명: {request.playlist_name}")
     print(f"  - 트랙 수: {len(request.track_names)}개")
     print(f"  - 설명: {request.description}")
     
-    try:
-        from app.services.spotify import track_search, create_playlist, add_tracks_to_playlist
-        
+    from app.services.spotify_async import track_search, create_playlist, add_tracks_to_playlist
+    
+    async def _search_and_save(tok: str):
         # 1단계: Spotify에서 각 곡 검색
         print(f"\n  [1단계] Spotify에서 트랙 검색 중...")
         spotify_track_ids = []
@@ -996,7 +1016,7 @@ async def save_lastfm_playlist(
             
             try:
                 # Spotify에서 검색
-                found_ids = track_search(access_token, query, market="KR", limit=1)
+                found_ids = await track_search(tok, query, market="KR", limit=1)
                 
                 if found_ids:
                     spotify_track_ids.append(found_ids[0])
@@ -1020,8 +1040,8 @@ async def save_lastfm_playlist(
         
         # 2단계: 플레이리스트 생성
         print(f"\n  [2단계] Spotify 플레이리스트 생성 중...")
-        playlist_id = create_playlist(
-            access_token,
+        playlist_id = await create_playlist(
+            tok,
             u.spotify_id,
             request.playlist_name,
             request.description,
@@ -1030,92 +1050,32 @@ async def save_lastfm_playlist(
         
         # 3단계: 트랙 추가
         print(f"\n  [3단계] 트랙 추가 중...")
-        add_tracks_to_playlist(access_token, playlist_id, spotify_track_ids)
-        
-        print(f"  ✓ 플레이리스트 저장 완료: {playlist_id}\n")
-        
-        return {
-            "success": True,
-            "playlist_id": playlist_id,
-            "playlist_url": f"https://open.spotify.com/playlist/{playlist_id}",
-            "tracks_added": len(spotify_track_ids),
-            "tracks_not_found": len(not_found),
-            "message": f"플레이리스트가 생성되었습니다! ({len(spotify_track_ids)}곡 추가)"
-        }
-        
+        await add_tracks_to_playlist(tok, playlist_id, spotify_track_ids)
+        return spotify_track_ids, not_found, playlist_id
+    
+    try:
+        spotify_track_ids, not_found, playlist_id = await token_manager.with_token(u, db, _search_and_save)
     except HTTPException:
         raise
+    except token_manager.TokenRefreshError as e:
+        print(f"[lastfm_router] Playlist creation failed: {e}")
+        raise HTTPException(
+            401,
+            "토큰이 만료되었습니다. 다시 로그인해주세요."
+        )
     except RuntimeError as e:
-        error_str = str(e)
-        
-        # 401 에러이고 refresh_token이 있으면 갱신 시도
-        if "401" in error_str and u.refresh_token:
-            print(f"[lastfm_router] Token error during playlist creation, attempting refresh...")
-            
-            try:
-                from app.services import user
-                new_token_data = user.refresh_access_token(u.refresh_token)
-                new_access_token = new_token_data.get("access_token")
-                
-                if not new_access_token:
-                    raise HTTPException(401, "토큰 갱신 실패. 다시 로그인해주세요.")
-                
-                # DB 업데이트
-                u.access_token = new_access_token
-                if new_token_data.get("refresh_token"):
-                    u.refresh_token = new_token_data["refresh_token"]
-                db.add(u)
-                db.commit()
-                
-                print(f"[lastfm_router] Token refreshed, retrying playlist creation...")
-                
-                # 갱신된 토큰으로 재시도
-                from app.services.spotify import track_search, create_playlist, add_tracks_to_playlist
-                
-                spotify_track_ids = []
-                for track_info in request.track_names:
-                    track_name = track_info.get("name", "")
-                    artist_name = track_info.get("artist", "")
-                    if not track_name or not artist_name:
-                        continue
-                    query = f"{track_name} {artist_name}"
-                    try:
-                        found_ids = track_search(new_access_token, query, market="KR", limit=1)
-                        if found_ids:
-                            spotify_track_ids.append(found_ids[0])
-                    except:
-                        pass
-                
-                if not spotify_track_ids:
-                    raise HTTPException(404, "Spotify에서 해당 곡들을 찾을 수 없습니다")
-                
-                playlist_id = create_playlist(
-                    new_access_token,
-                    u.spotify_id,
-                    request.playlist_name,
-                    request.description,
-                    public=False
-                )
-                
-                add_tracks_to_playlist(new_access_token, playlist_id, spotify_track_ids)
-                
-                return {
-                    "success": True,
-                    "playlist_id": playlist_id,
-                    "playlist_url": f"https://open.spotify.com/playlist/{playlist_id}",
-                    "tracks_added": len(spotify_track_ids),
-                    "message": "플레이리스트가 생성되었습니다!"
-                }
-                
-            except Exception as refresh_error:
-                print(f"[lastfm_router] Playlist creation failed: {refresh_error}")
-                raise HTTPException(
-                    401,
-                    "토큰이 만료되었습니다. 다시 로그인해주세요."
-                )
-        else:
-            raise HTTPException(500, f"플레이리스트 생성 실패: {error_str}")
-    
+        raise HTTPException(500, f"플레이리스트 생성 실패: {e}")
     except Exception as e:
         print(f"[lastfm_router] Unexpected error: {e}")
-        raise HTTPException(500, f"플레이리스트 생성 중 오류 발생: {str(e)}")
\ No newline at end of file
+        raise HTTPException(500, f"플레이리스트 생성 중 오류 발생: {str(e)}")
+    
+    print(f"  ✓ 플레이리스트 저장 완료: {playlist_id}\n")
+    
+    return {
+        "success": True,
+        "playlist_id": playlist_id,
+        "playlist_url": f"https://open.spotify.com/playlist/{playlist_id}",
+        "tracks_added": len(spotify_track_ids),
+        "tracks_not_found": len(not_found),
+        "message": f"플레이리스트가 생성되었습니다! ({len(spotify_track_ids)}곡 추가)"
+    }
@@ -1,38 +1,31 @@
 import os
-import requests
-from datetime import datetime, timedelta
-from typing import List, Dict
+import asyncio
+from datetime import datetime
+from typing import List, Dict, Tuple
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel, Field
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
 from dotenv import load_dotenv
 from app.routers.user_router import current_user
 from app.models.user import User
 from app.core.database import get_db
+from app.services.lastfm import lastfm_get, PRIORITY_CRITICAL
+from app.services import app_token, episode_index
+from app.services.episode_index import MIN_DURATION_MINUTES, MAX_DURATION_MINUTES, MAX_RECENCY_DAYS
 
 load_dotenv()
 
 router = APIRouter(prefix="/podcast", tags=["podcast"])
 
-SP_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
-SP_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
 LASTFM_API_KEY = os.getenv("LASTFM_API_KEY")
 
-# 필터링 기준
-MIN_DURATION_MINUTES = 15
-MAX_DURATION_MINUTES = 90
-MAX_RECENCY_DAYS = 365
+# 요청 하나가 동시에 보내는 에피소드 검색 수
+PODCAST_SEARCH_CONCURRENCY = int(os.getenv("PODCAST_SEARCH_CONCURRENCY", "4"))
 
 
-def get_spotify_client():
-    """Spotify 클라이언트 생성"""
+async def get_spotify_token() -> str:
+    """앱 전체가 공유하는 client-credentials 토큰 (만료 전 미리 갱신, 동시 요청은 한 번만 발급)"""
     try:
-        sp = spotipy.Spotify(auth_manager=SpotifyClientCredentials(
-            client_id=SP_CLIENT_ID,
-            client_secret=SP_CLIENT_SECRET
-        ))
-        return sp
+        return await app_token.get_token()
     except Exception as e:
         raise HTTPException(500, f"Spotify 인증 실패: {e}")
 
@@ -47,17 +40,8 @@ async def get_similar_artists_from_lastfm(artist_name: str, limit: int = 7) -> L
     print(f"{'='*80}")
     
     try:
-        LASTFM_URL = "http://ws.audioscrobbler.com/2.0/"
-        params = {
-            "method": "artist.getsimilar",
-            "artist": artist_name,
-            "api_key": LASTFM_API_KEY,
-            "format": "json",
-            "limit": limit
-        }
-        response = requests.get(LASTFM_URL, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        # Last.fm 추천과 같은 클라이언트·캐시·속도 제한을 사용
+        data = await lastfm_get("artist.getSimilar", {"artist": artist_name, "limit": limit}, PRIORITY_CRITICAL)
         
         artists = data.get("similarartists", {}).get("artist", [])
         related_artists = [{"name": artist["name"]} for artist in artists]
@@ -73,38 +57,39 @@ async def get_similar_artists_from_lastfm(artist_name: str, limit: int = 7) -> L
         raise HTTPException(502, f"Last.fm API 오류: {e}")
 
 
-async def search_podcasts_by_artists(sp, artists: List[Dict]) -> List[Dict]:
-    """아티스트별 팟캐스트 에피소드 검색"""
+async def search_podcasts_by_artists(tok: str, artists: List[Dict]) -> Tuple[List[Dict], int]:
+    """아티스트별 팟캐스트 에피소드 검색 (최대 PODCAST_SEARCH_CONCURRENCY 개 동시, 결과는 아티스트 순서대로 병합).
+    인덱스/캐시에 있는 아티스트는 검색하지 않는다. 반환 항목은 episode_index 형식 (길이·날짜 해석 완료).
+    (에피소드 항목, 검색으로 찾은 고유 에피소드 수) 를 돌려준다. 인덱스 항목은 미리 걸러져 있어 수가 더 클 수 있음"""
     print(f"\n{'='*80}")
     print(f"🎙️ 2단계: {len(artists)}명 아티스트의 '팟캐스트 에피소드' 검색")
     print(f"{'='*80}")
     
+    sem = asyncio.Semaphore(max(1, PODCAST_SEARCH_CONCURRENCY))
+    
+    async def search_one(artist_name: str) -> Tuple[List[Dict], List[str]]:
+        async with sem:
+            print(f"  • {artist_name} 검색 중...")
+            try:
+                return await episode_index.episodes(tok, artist_name)
+            except Exception as e:
+                print(f"    └─ ❌ {artist_name} 검색 실패: {e}")
+                return [], []
+    
+    results = await asyncio.gather(*(search_one(artist["name"]) for artist in artists))
+    
     all_episodes = []
     processed_episode_ids = set()
+    found_ids = set()
+    for episodes, ids in results:
+        found_ids.update(ids)
+        for item in episodes:
+            if item["ep"]['id'] not in processed_episode_ids:
+                all_episodes.append(item)
+                processed_episode_ids.add(item["ep"]['id'])
     
-    for artist in artists:
-        artist_name = artist["name"]
-        print(f"  • {artist_name} 검색 중...")
-        
-        try:
-            results = sp.search(
-                q=f"{artist_name} interview",
-                type="episode",
-                limit=10
-            )
-            
-            episodes = results.get("episodes", {}).get("items", [])
-            
-            for ep in episodes:
-                if ep['id'] not in processed_episode_ids:
-                    all_episodes.append(ep)
-                    processed_episode_ids.add(ep['id'])
-                    
-        except Exception as e:
-            print(f"    └─ ❌ {artist_name} 검색 실패: {e}")
-    
-    print(f"\n✅ 총 {len(all_episodes)}개의 고유한 에피소드 수집 완료")
-    return all_episodes
+    print(f"\n✅ 총 {len(found_ids)}개의 고유한 에피소드 수집 완료")
+    return all_episodes, len(found_ids)
 
 
 def filter_episodes(episodes: List[Dict]) -> List[Dict]:
@@ -114,33 +99,8 @@ def filter_episodes(episodes: List[Dict]) -> List[Dict]:
     print(f"  (조건: {MIN_DURATION_MINUTES}~{MAX_DURATION_MINUTES}분 / 최근 {MAX_RECENCY_DAYS}일 이내)")
     print(f"{'='*80}")
     
-    filtered_episodes = []
-    today = datetime.now()
-    recency_limit_date = today - timedelta(days=MAX_RECENCY_DAYS)
-    
-    for ep in episodes:
-        try:
-            # 1. 길이 필터링
-            duration_ms = ep.get("duration_ms", 0)
-            duration_min = duration_ms / 60000
-            
-            if not (MIN_DURATION_MINUTES <= duration_min <= MAX_DURATION_MINUTES):
-                continue
-            
-            # 2. 날짜 필터링
-            release_date_str = ep.get("release_date", "1900-01-01")
-            if ep.get("release_date_precision") != "day":
-                continue
-                
-            release_date = datetime.strptime(release_date_str, "%Y-%m-%d")
-            
-            if release_date < recency_limit_date:
-                continue
-                
-            filtered_episodes.append(ep)
-            
-        except Exception as e:
-            print(f"    └─ ⚠️ 에피소드 '{ep.get('name', 'Unknown')}' 파싱 중 오류: {e}")
+    # 길이와 날짜는 검색 결과를 캐시할 때 미리 해석되어 있음 (정밀도가 day 가 아니면 날짜 0 → 탈락)
+    filtered_episodes = [episodes[i] for i in episode_index.filter_indices(episodes, datetime.now())]
     
     print(f"\n✅ 총 {len(filtered_episodes)}개의 에피소드가 필터를 통과했습니다.")
     return filtered_episodes
@@ -152,18 +112,13 @@ def format_episodes(episodes: List[Dict], limit: int = 5) -> List[Dict]:
     print("🎧 4단계: 최종 추천 플레이리스트 (최신순 정렬)")
     print(f"{'='*80}")
     
-    # 최신순 정렬
-    sorted_episodes = sorted(
-        episodes,
-        key=lambda ep: ep["release_date"],
-        reverse=True
-    )
-    
-    final_playlist = sorted_episodes[:limit]
+    # 최신순 상위 limit 개만 부분 선택
+    final_playlist = [episodes[i] for i in episode_index.top_recent(episodes, limit)]
     
     result = []
-    for idx, ep in enumerate(final_playlist, 1):
-        duration_min = ep['duration_ms'] / 60000
+    for idx, item in enumerate(final_playlist, 1):
+        ep = item["ep"]
+        duration_min = item["duration_min"]
         show_name = ep.get('show', {}).get('name', 'Unknown Show')
         show_publisher = ep.get('show', {}).get('publisher', 'Unknown Publisher')
         
@@ -231,11 +186,11 @@ async def recommend_podcasts(
         if not related_artists:
             raise HTTPException(404, f"'{req.artist_name}'의 유사 아티스트를 찾을 수 없습니다")
         
-        # 2. Spotify 클라이언트 생성 및 에피소드 검색
-        sp = get_spotify_client()
-        all_episodes = await search_podcasts_by_artists(sp, related_artists)
+        # 2. 앱 토큰으로 에피소드 검색
+        tok = await get_spotify_token()
+        all_episodes, total_found = await search_podcasts_by_artists(tok, related_artists)
         
-        if not all_episodes:
+        if not total_found:
             raise HTTPException(404, "팟캐스트 에피소드를 찾을 수 없습니다")
         
         # 3. 필터링
@@ -254,7 +209,7 @@ async def recommend_podcasts(
         return {
             "artist": req.artist_name,
             "related_artists": [a["name"] for a in related_artists],
-            "total_episodes_found": len(all_episodes),
+            "total_episodes_found": total_found,
             "total_filtered": len(filtered_episodes),
             "recommendations": recommendations
         }
@@ -271,6 +226,6 @@ def health():
     """헬스체크"""
     return {
         "ok": True,
-        "spotify": bool(SP_CLIENT_ID and SP_CLIENT_SECRET),
+        "spotify": app_token.configured(),
         "lastfm": bool(LASTFM_API_KEY)
     }
\ No newline at end of file
@@ -3,7 +3,7 @@ from fastapi.responses import RedirectResponse, JSONResponse
 from sqlalchemy import select
 from app.core.database import get_db
 from app.models.user import User
-from app.services import user
+from app.services import user, token_manager
 import requests
 
 
@@ -34,8 +34,7 @@ def callback(code: str | None = None, state: str | None = None, error: str | Non
     u = db.execute(select(User).where(User.spotify_id==sp_id)).scalar_one_or_none()
     if not u: u = User(spotify_id=sp_id)
     u.name = me.get("display_name") or sp_id
-    u.access_token = token_data["access_token"]
-    u.refresh_token = token_data.get("refresh_token") 
+    token_manager.apply_tokens(u, token_data)
     db.add(u); db.commit()
 
     resp = RedirectResponse(url="/")  
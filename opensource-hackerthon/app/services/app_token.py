@@ -0,0 +1,63 @@
+"""앱 단위 Spotify client-credentials 토큰.
+
+사용자와 무관한 공개 데이터(검색, 플레이리스트 조회) 호출에 쓴다.
+만료 APP_TOKEN_REFRESH_MARGIN 초 전에 미리 갱신하고, 동시에 갱신이 필요해진 호출은 한 번의 요청을 공유한다.
+"""
+import os
+import time
+import base64
+from app.core import http
+from app.core.singleflight import AsyncSingleFlight
+
+SPOTIFY_TOKEN_URL = "https://accounts.spotify.com/api/token"
+APP_TOKEN_REFRESH_MARGIN = int(os.getenv("APP_TOKEN_REFRESH_MARGIN", "60"))
+
+_token = {"val": None, "exp": 0.0}
+_flight = AsyncSingleFlight()
+_stats = {"fetched": 0, "failed": 0}
+
+
+def _credentials():
+    # .env 는 라우터 import 시점에 로드되므로 호출할 때 읽음
+    return os.getenv("SPOTIFY_CLIENT_ID", ""), os.getenv("SPOTIFY_CLIENT_SECRET", "")
+
+
+def configured() -> bool:
+    cid, secret = _credentials()
+    return bool(cid and secret)
+
+
+async def _fetch() -> str:
+    cid, secret = _credentials()
+    if not cid or not secret:
+        raise RuntimeError("No Spotify credentials")
+    auth = base64.b64encode(f"{cid}:{secret}".encode()).decode()
+    try:
+        r = await http.client("spotify").post(
+            SPOTIFY_TOKEN_URL,
+            data={"grant_type": "client_credentials"},
+            headers={"Authorization": f"Basic {auth}"},
+        )
+        r.raise_for_status()
+        js = r.json()
+    except Exception:
+        _stats["failed"] += 1
+        raise
+    _token["val"] = js["access_token"]
+    _token["exp"] = time.time() + js.get("expires_in", 3600)
+    _stats["fetched"] += 1
+    return _token["val"]
+
+
+async def get_token() -> str:
+    if _token["val"] and _token["exp"] - time.time() > APP_TOKEN_REFRESH_MARGIN:
+        return _token["val"]
+    return await _flight.do("app", _fetch)
+
+
+def stats() -> dict:
+    return {
+        **_stats,
+        "coalesced": _flight.shared,
+        "expires_in": max(0, int(_token["exp"] - time.time())) if _token["val"] else None,
+    }
@@ -0,0 +1,110 @@
+"""Deezer 검색 결과 캐시 (정규화된 (artist, track) 단위).
+
+'찾지 못함'도 더 짧은 TTL 로 캐시해서 없는 곡을 매번 다시 검색하지 않는다.
+메모리에 없으면 SQLite(deezer_match 테이블)를 2차 저장소로 쓰고,
+새로 찾은 결과는 모아 두었다가 flush() 때 한 번에 upsert 한다.
+"""
+import os
+import time
+import threading
+from typing import Dict, List, Optional, Tuple
+from app.core.cache import TTLCache
+from app.services import metadata_store
+from app.services.metadata_store import norm
+
+DEEZER_CACHE_SIZE = int(os.getenv("DEEZER_CACHE_SIZE", "20000"))
+DEEZER_CACHE_TTL = float(os.getenv("DEEZER_CACHE_TTL", str(7 * 24 * 3600)))
+DEEZER_MISS_TTL = float(os.getenv("DEEZER_MISS_TTL", str(24 * 3600)))
+DEEZER_CACHE_PERSIST = os.getenv("DEEZER_CACHE_PERSIST", "1") == "1"
+DEEZER_DB_MAX_AGE = float(os.getenv("DEEZER_DB_MAX_AGE", str(30 * 24 * 3600)))
+DEEZER_DB_MISS_MAX_AGE = float(os.getenv("DEEZER_DB_MISS_MAX_AGE", str(3 * 24 * 3600)))
+
+_MISS = object()  # '매칭 없음' 표시 (None 은 캐시에 없음과 구분이 안 됨)
+
+_cache = TTLCache(maxsize=DEEZER_CACHE_SIZE, ttl=DEEZER_CACHE_TTL)
+_pending: Dict[Tuple[str, str], Tuple[str, str, Optional[Dict]]] = {}
+_lock = threading.Lock()
+_stats = {"negative_hits": 0, "db_hits": 0, "db_stale": 0, "stored": 0, "persisted": 0}
+
+
+def key(artist: str, track: str) -> Tuple[str, str]:
+    return norm(artist), norm(track)
+
+
+def get(artist: str, track: str) -> Tuple[bool, Optional[Dict]]:
+    """(캐시에 있는지, 매칭 결과). 캐시된 '매칭 없음'은 (True, None)"""
+    v = _cache.get(key(artist, track))
+    if v is None:
+        return False, None
+    if v is _MISS:
+        _stats["negative_hits"] += 1
+        return True, None
+    return True, v
+
+
+def put(artist: str, track: str, match: Optional[Dict]) -> None:
+    """검색 결과 저장 (match=None 은 '매칭 없음'). 오류로 실패한 검색은 넣지 말 것"""
+    k = key(artist, track)
+    if match is None:
+        _cache.set(k, _MISS, DEEZER_MISS_TTL)
+    else:
+        _cache.set(k, match)
+    _stats["stored"] += 1
+    if DEEZER_CACHE_PERSIST:
+        with _lock:
+            _pending[k] = (artist, track, match)
+
+
+def load_persisted(pairs: List[Tuple[str, str]]) -> int:
+    """메모리에 없는 (artist, track) 을 DB 에서 한 번에 읽어 메모리를 채움. 채운 개수 반환"""
+    if not DEEZER_CACHE_PERSIST or not pairs:
+        return 0
+    missing = [k for k in dict.fromkeys(key(a, t) for a, t in pairs) if k not in _cache]
+    if not missing:
+        return 0
+    try:
+        rows = metadata_store.get_deezer_rows(missing)
+    except Exception as e:
+        print(f"[deezer_cache] DB 조회 실패: {e}")
+        return 0
+    now = time.time()
+    loaded = 0
+    for k, (match, updated_at) in rows.items():
+        age = now - updated_at
+        max_age = DEEZER_DB_MAX_AGE if match is not None else DEEZER_DB_MISS_MAX_AGE
+        if age > max_age:
+            _stats["db_stale"] += 1
+            continue
+        # DB 에서의 남은 수명만큼만 메모리에 둠
+        ttl = min(DEEZER_CACHE_TTL if match is not None else DEEZER_MISS_TTL, max_age - age)
+        _cache.set(k, _MISS if match is None else match, ttl)
+        loaded += 1
+    _stats["db_hits"] += loaded
+    return loaded
+
+
+def flush() -> int:
+    """모아 둔 새 결과를 DB 에 upsert"""
+    with _lock:
+        items = list(_pending.values())
+        _pending.clear()
+    if not items:
+        return 0
+    try:
+        n = metadata_store.upsert_deezer_matches(items)
+    except Exception as e:
+        print(f"[deezer_cache] DB 저장 실패: {e}")
+        return 0
+    _stats["persisted"] += n
+    return n
+
+
+def stats() -> dict:
+    s = _cache.stats()
+    return {
+        **s,
+        **_stats,
+        "stale": s["expired"] + _stats["db_stale"],
+        "pending": len(_pending),
+        "persist": DEEZER_CACHE_PERSIST,
+    }
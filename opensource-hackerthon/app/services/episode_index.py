@@ -0,0 +1,235 @@
+"""아티스트별 팟캐스트 에피소드 검색 캐시와 사전 계산 인덱스.
+
+- 캐시: "{artist} interview" 검색 결과를 아티스트(정규화) 단위로 TTL 동안 보관한다.
+  저장할 때 길이(분)와 업로드 날짜를 미리 해석해 두므로 요청 경로에서는 다시 파싱하지 않는다.
+- 인덱스 (EPISODE_INDEX_ENABLED=1 일 때): 자주 요청된 아티스트의 에피소드를
+  백그라운드 워커가 앱 토큰으로 주기적으로 다시 검색하고, 길이·날짜 정밀도 조건을 통과한 것만 둔다.
+  인덱스에 있는 아티스트는 필터링·정렬이 작은 집합 위에서만 돈다.
+  걸러 내기 전 검색 결과의 에피소드 ID 는 따로 보관해 "찾은 에피소드 수"는 인덱스 여부와 관계없이 같다.
+
+에피소드 항목 형식: {"ep": 원본 응답, "duration_min": float, "day": 업로드 날짜의 ordinal (알 수 없으면 0)}
+필터링·최신순 선택은 길이/날짜 열을 NumPy 배열로 만들어 마스크와 부분 선택(argpartition)으로 처리한다.
+NumPy 가 없으면 같은 결과를 내는 순수 파이썬 루프로 동작한다.
+"""
+import os
+import time
+import asyncio
+from collections import Counter
+from datetime import datetime, time as dtime, timedelta
+from typing import Dict, List, Optional, Tuple
+from app.core.cache import TTLCache
+from app.core.singleflight import AsyncSingleFlight
+from app.services import spotify_async, app_token
+from app.services.metadata_store import norm
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy 미설치 환경
+    np = None
+
+# 필터링 기준
+MIN_DURATION_MINUTES = 15
+MAX_DURATION_MINUTES = 90
+MAX_RECENCY_DAYS = 365
+
+EPISODE_SEARCH_LIMIT = int(os.getenv("EPISODE_SEARCH_LIMIT", "10"))
+EPISODE_CACHE_SIZE = int(os.getenv("EPISODE_CACHE_SIZE", "2000"))
+EPISODE_CACHE_TTL = float(os.getenv("EPISODE_CACHE_TTL", str(6 * 3600)))
+EPISODE_EMPTY_TTL = float(os.getenv("EPISODE_EMPTY_TTL", "1800"))
+
+EPISODE_INDEX_ENABLED = os.getenv("EPISODE_INDEX_ENABLED", "0") == "1"
+EPISODE_INDEX_SIZE = int(os.getenv("EPISODE_INDEX_SIZE", "200"))
+EPISODE_INDEX_TTL = float(os.getenv("EPISODE_INDEX_TTL", str(12 * 3600)))
+EPISODE_INDEX_INTERVAL = float(os.getenv("EPISODE_INDEX_INTERVAL", "1800"))
+EPISODE_INDEX_CONCURRENCY = int(os.getenv("EPISODE_INDEX_CONCURRENCY", "2"))
+# 요청 빈도를 세는 아티스트 수 상한 (넘으면 상위 절반만 남김)
+EPISODE_DEMAND_MAX = int(os.getenv("EPISODE_DEMAND_MAX", "5000"))
+
+_cache = TTLCache(maxsize=EPISODE_CACHE_SIZE, ttl=EPISODE_CACHE_TTL)
+_flight = AsyncSingleFlight()
+_index: Dict[str, Dict] = {}
+_demand: Counter = Counter()
+_names: Dict[str, str] = {}  # 정규화 키 → 검색에 쓸 원래 이름
+_task: Optional[asyncio.Task] = None
+_stats = {"index_hits": 0, "fetched": 0, "parse_errors": 0, "index_builds": 0, "last_run_at": None}
+
+
+def parse_episode(ep: Dict) -> Dict:
+    """길이와 업로드 날짜를 미리 해석. 날짜 정밀도가 day 가 아니거나 해석할 수 없으면 day=0"""
+    day = 0
+    if ep.get("release_date_precision") == "day":
+        try:
+            day = datetime.strptime(ep.get("release_date", "1900-01-01"), "%Y-%m-%d").toordinal()
+        except (TypeError, ValueError) as e:
+            _stats["parse_errors"] += 1
+            print(f"    └─ ⚠️ 에피소드 '{ep.get('name', 'Unknown')}' 파싱 중 오류: {e}")
+    return {"ep": ep, "duration_min": (ep.get("duration_ms") or 0) / 60000, "day": day}
+
+
+def static_ok(item: Dict) -> bool:
+    """시간이 지나도 바뀌지 않는 조건 (길이, 날짜 정밀도)"""
+    return item["day"] > 0 and MIN_DURATION_MINUTES <= item["duration_min"] <= MAX_DURATION_MINUTES
+
+
+def _min_day(now: datetime) -> int:
+    """업로드일(자정 기준)이 now - MAX_RECENCY_DAYS 이후인 최소 ordinal"""
+    limit = now - timedelta(days=MAX_RECENCY_DAYS)
+    return limit.toordinal() + (0 if limit.time() == dtime(0) else 1)
+
+
+def filter_indices(items: List[Dict], now: datetime) -> List[int]:
+    """길이·날짜 조건을 통과한 항목의 인덱스 (입력 순서)"""
+    min_day = _min_day(now)
+    if np is None:
+        return [i for i, it in enumerate(items)
+                if MIN_DURATION_MINUTES <= it["duration_min"] <= MAX_DURATION_MINUTES and it["day"] >= min_day]
+    n = len(items)
+    dur = np.fromiter((it["duration_min"] for it in items), dtype=np.float64, count=n)
+    day = np.fromiter((it["day"] for it in items), dtype=np.int64, count=n)
+    mask = (dur >= MIN_DURATION_MINUTES) & (dur <= MAX_DURATION_MINUTES) & (day >= min_day)
+    return np.flatnonzero(mask).tolist()
+
+
+def top_recent(items: List[Dict], k: int) -> List[int]:
+    """업로드일 최신순 상위 k 개의 인덱스 (같은 날짜는 입력 순서)"""
+    n = len(items)
+    k = min(k, n)
+    if k <= 0:
+        return []
+    if np is None:
+        return sorted(range(n), key=lambda i: items[i]["day"], reverse=True)[:k]
+    neg = -np.fromiter((it["day"] for it in items), dtype=np.int64, count=n)
+    if k < n:
+        # k 번째 값 이하(경계 동점 포함)만 남긴 뒤 그 안에서만 정렬
+        kth = np.partition(neg, k - 1)[k - 1]
+        cand = np.flatnonzero(neg <= kth)
+    else:
+        cand = np.arange(n)
+    return cand[np.argsort(neg[cand], kind="stable")[:k]].tolist()
+
+
+async def _fetch(tok: str, artist: str) -> List[Dict]:
+    eps = await spotify_async.episode_search(tok, f"{artist} interview", limit=EPISODE_SEARCH_LIMIT)
+    _stats["fetched"] += 1
+    return [parse_episode(ep) for ep in eps]
+
+
+def _record_demand(key: str, artist: str) -> None:
+    _demand[key] += 1
+    _names[key] = artist
+    if len(_demand) > EPISODE_DEMAND_MAX:
+        keep = dict(_demand.most_common(EPISODE_DEMAND_MAX // 2))
+        _demand.clear()
+        _demand.update(keep)
+        for k in set(_names) - set(keep):
+            del _names[k]
+
+
+async def episodes(tok: str, artist: str) -> Tuple[List[Dict], List[str]]:
+    """(아티스트의 에피소드 항목, 검색 결과 전체의 에피소드 ID). 인덱스 → 캐시 → Spotify 검색 순.
+    인덱스 항목은 시간과 무관한 조건으로 미리 걸러져 있으므로 ID 목록이 항목보다 길 수 있다.
+    검색 오류는 호출 쪽으로 전달"""
+    key = norm(artist)
+    if EPISODE_INDEX_ENABLED:
+        _record_demand(key, artist)
+        entry = _index.get(key)
+        if entry is not None and time.time() - entry["built_at"] <= EPISODE_INDEX_TTL:
+            _stats["index_hits"] += 1
+            return entry["episodes"], entry["found_ids"]
+
+    items = _cache.get(key)
+    if items is None:
+        async def fetch() -> List[Dict]:
+            items = await _fetch(tok, artist)
+            _cache.set(key, items, EPISODE_CACHE_TTL if items else EPISODE_EMPTY_TTL)
+            return items
+
+        items = await _flight.do(key, fetch)
+    return items, [it["ep"]["id"] for it in items]
+
+
+async def build(tok: str, artist: str) -> Dict:
+    """아티스트를 다시 검색해 인덱스 항목을 교체 (캐시도 함께 갱신)"""
+    key = norm(artist)
+    items = await _fetch(tok, artist)
+    _cache.set(key, items, EPISODE_CACHE_TTL if items else EPISODE_EMPTY_TTL)
+    entry = {
+        "artist": artist,
+        "episodes": [it for it in items if static_ok(it)],
+        "found_ids": [it["ep"]["id"] for it in items],
+        "built_at": time.time(),
+    }
+    _index[key] = entry
+    _stats["index_builds"] += 1
+    return entry
+
+
+async def refresh_all() -> dict:
+    """요청이 많은 상위 EPISODE_INDEX_SIZE 명의 인덱스를 갱신 (TTL 의 절반이 지나지 않은 항목은 건너뜀)"""
+    tok = await app_token.get_token()
+    sem = asyncio.Semaphore(max(1, EPISODE_INDEX_CONCURRENCY))
+    done = failed = 0
+
+    async def one(key: str):
+        nonlocal done, failed
+        entry = _index.get(key)
+        if entry and time.time() - entry["built_at"] < EPISODE_INDEX_TTL / 2:
+            return
+        async with sem:
+            try:
+                await build(tok, _names.get(key, key))
+                done += 1
+            except Exception as e:
+                failed += 1
+                print(f"[episode_index] '{key}' 갱신 실패: {e}")
+
+    top = [k for k, _ in _demand.most_common(EPISODE_INDEX_SIZE)]
+    await asyncio.gather(*(one(k) for k in top))
+    # 상위권에서 밀려난 아티스트는 인덱스에서 제거
+    for k in set(_index) - set(top):
+        del _index[k]
+    _stats["last_run_at"] = int(time.time())
+    return {"refreshed": done, "failed": failed}
+
+
+async def _loop() -> None:
+    while True:
+        await asyncio.sleep(EPISODE_INDEX_INTERVAL)
+        try:
+            res = await refresh_all()
+            print(f"[episode_index] 주기 갱신: {res}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[episode_index] 주기 갱신 오류: {e}")
+
+
+def start() -> None:
+    global _task
+    if not EPISODE_INDEX_ENABLED or not app_token.configured() or (_task and not _task.done()):
+        return
+    _task = asyncio.create_task(_loop())
+
+
+async def stop() -> None:
+    global _task
+    if _task is None:
+        return
+    _task.cancel()
+    try:
+        await _task
+    except asyncio.CancelledError:
+        pass
+    _task = None
+
+
+def stats() -> dict:
+    return {
+        **_stats,
+        "cache": {**_cache.stats(), "coalesced": _flight.shared},
+        "index_enabled": EPISODE_INDEX_ENABLED,
+        "indexed_artists": len(_index),
+        "indexed_episodes": sum(len(e["episodes"]) for e in _index.values()),
+        "tracked_artists": len(_demand),
+        "worker": _task is not None and not _task.done(),
+    }
@@ -0,0 +1,168 @@
+"""Last.fm API 클라이언트.
+
+Last.fm 추천(lastfm_router)과 팟캐스트 유사 아티스트 조회(podcast_router)가 함께 쓴다.
+- 메서드별 TTL 응답 캐시, 같은 요청 동시 호출은 한 번만 (single-flight)
+- API 키 단위 속도 제한: 우선순위 스케줄러, 같은 우선순위 안에서는 요청(흐름)끼리 번갈아 호출
+- 곡 태그는 메모리에 없으면 DB(lastfm_tag 테이블)를 2차 저장소로 씀
+"""
+import os
+import asyncio
+import itertools
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from app.core import http
+from app.core.cache import TTLCache
+from app.core.ratelimit import AsyncPriorityScheduler
+from app.core.singleflight import AsyncSingleFlight
+from app.services import metadata_store
+
+load_dotenv()
+
+LASTFM_API_KEY = os.getenv("LASTFM_API_KEY", "")
+LASTFM = "https://ws.audioscrobbler.com/2.0/"
+
+# 메서드별 응답 캐시 TTL(초): 태그는 오래, 유사 곡은 짧게
+LASTFM_CACHE_SIZE = int(os.getenv("LASTFM_CACHE_SIZE", "5000"))
+LASTFM_METHOD_TTL = {
+    "track.getTopTags": float(os.getenv("LASTFM_TAGS_TTL", str(3 * 24 * 3600))),
+    "tag.getTopTracks": float(os.getenv("LASTFM_TOP_TAG_TTL", str(12 * 3600))),
+    "track.getSimilar": float(os.getenv("LASTFM_SIMILAR_TTL", str(6 * 3600))),
+    "artist.getSimilar": float(os.getenv("LASTFM_ARTIST_SIMILAR_TTL", str(24 * 3600))),
+}
+LASTFM_DEFAULT_TTL = float(os.getenv("LASTFM_DEFAULT_TTL", "3600"))
+# '곡/태그 없음'(error 6) 응답은 짧게만 캐시
+LASTFM_MISS_TTL = float(os.getenv("LASTFM_MISS_TTL", "3600"))
+# tag.getTopTracks 는 항상 이 개수 이상으로 받아 limit 이 달라도 같은 캐시 항목을 씀
+LASTFM_TOP_TAG_FETCH = int(os.getenv("LASTFM_TOP_TAG_FETCH", "60"))
+# 곡 태그는 잘 바뀌지 않으므로 메모리에 없으면 SQLite(lastfm_tag 테이블)를 2차 저장소로 씀
+LASTFM_TAGS_PERSIST = os.getenv("LASTFM_TAGS_PERSIST", "1") == "1"
+LASTFM_TAGS_DB_MAX_AGE = float(os.getenv("LASTFM_TAGS_DB_MAX_AGE", str(30 * 24 * 3600)))
+
+# API 키 하나당 초당 호출 수 제한 (Last.fm 공개 기준 5 req/s)
+LASTFM_RATE = float(os.getenv("LASTFM_RATE", "5"))
+LASTFM_BURST = float(os.getenv("LASTFM_BURST", "5"))
+LASTFM_MAX_RETRIES = int(os.getenv("LASTFM_MAX_RETRIES", "2"))
+LASTFM_RATE_LIMIT_BACKOFF = float(os.getenv("LASTFM_RATE_LIMIT_BACKOFF", "2"))
+# 스케줄러 우선순위 (작을수록 먼저): 시드 태그/유사 곡 > 태그별 곡 > 보완용 호출
+PRIORITY_CRITICAL, PRIORITY_NORMAL, PRIORITY_LOW = 0, 1, 2
+
+_lf_cache = TTLCache(maxsize=LASTFM_CACHE_SIZE, ttl=LASTFM_DEFAULT_TTL)
+_lf_scheduler = AsyncPriorityScheduler("lastfm", rate=LASTFM_RATE, burst=LASTFM_BURST)
+# 요청(추천 한 번) 단위 식별자: 같은 우선순위 안에서 요청끼리 번갈아 호출
+_lf_flow: ContextVar = ContextVar("lastfm_flow", default=None)
+_lf_flow_ids = itertools.count(1)
+_lf_flight = AsyncSingleFlight()
+_lf_method_stats: Dict[str, Counter] = {}
+
+
+def new_flow() -> None:
+    """현재 작업(추천 한 번)에 새 요청 식별자를 붙임. 이후 이 작업의 호출은 같은 흐름으로 스케줄링됨"""
+    _lf_flow.set(next(_lf_flow_ids))
+
+
+def _lf_key(method: str, params: Dict) -> Tuple:
+    # artist/track/tag 의 대소문자·공백 차이는 같은 요청으로 취급
+    return (method, tuple(sorted((k, " ".join(str(v).lower().split())) for k, v in params.items())))
+
+
+async def lastfm_get(method: str, params: Dict, priority: int = PRIORITY_NORMAL) -> Dict:
+    key = _lf_key(method, params)
+    ms = _lf_method_stats.setdefault(method, Counter())
+    cached = _lf_cache.get(key)
+    if cached is not None:
+        ms["hits"] += 1
+        return cached
+    ms["misses"] += 1
+    
+    async def fetch() -> Dict:
+        q = {"method": method, "api_key": LASTFM_API_KEY, "format": "json"}
+        q.update(params)
+        headers = {
+            "User-Agent": "MusicRecommender/1.0",
+            "Accept": "application/json"
+        }
+        for attempt in range(LASTFM_MAX_RETRIES + 1):
+            await _lf_scheduler.acquire(priority, _lf_flow.get())
+            r = await http.client("lastfm").get(LASTFM, params=q, headers=headers)
+            r.raise_for_status()
+            js = r.json()
+            if js.get("error") != 29:
+                break
+            # 속도 제한 초과: 모든 Last.fm 호출을 잠시 멈추고 재시도
+            print(f"[Last.fm] 속도 제한(error 29), 재시도 {attempt + 1}/{LASTFM_MAX_RETRIES}")
+            _lf_scheduler.penalize(LASTFM_RATE_LIMIT_BACKOFF)
+        if js.get("error") == 6:
+            _lf_cache.set(key, js, LASTFM_MISS_TTL)
+        elif not js.get("error"):
+            _lf_cache.set(key, js, LASTFM_METHOD_TTL.get(method, LASTFM_DEFAULT_TTL))
+        return js
+    
+    return await _lf_flight.do(key, fetch)
+
+
+def stats() -> dict:
+    return {
+        **_lf_cache.stats(),
+        "coalesced": _lf_flight.shared,
+        "methods": {m: dict(c) for m, c in _lf_method_stats.items()},
+        "scheduler": _lf_scheduler.stats(),
+    }
+
+
+async def _load_persisted_tags(key: Tuple, artist: str, track: str) -> Optional[List[str]]:
+    """DB 에 저장된 곡 태그를 읽어 메모리 캐시에 다시 올림. 없거나 오래됐으면 None"""
+    try:
+        tags = await asyncio.to_thread(metadata_store.get_lastfm_tags, artist, track, LASTFM_TAGS_DB_MAX_AGE)
+    except Exception as e:
+        print(f"[Last.fm] 태그 DB 조회 실패: {e}")
+        return None
+    if tags is not None:
+        _lf_method_stats.setdefault("track.getTopTags", Counter())["db_hits"] += 1
+        _lf_cache.set(key, {"toptags": {"tag": [{"name": t} for t in tags]}}, LASTFM_METHOD_TTL["track.getTopTags"])
+    return tags
+
+
+async def lf_track_tags(artist: str, track: str, priority: int = PRIORITY_CRITICAL) -> List[str]:
+    params = {"artist": artist, "track": track}
+    # 메모리에 없을 때만 DB 를 보고, 새로 받아 온 결과만 DB 에 저장
+    key = _lf_key("track.getTopTags", params)
+    fresh = LASTFM_TAGS_PERSIST and key not in _lf_cache
+    if fresh:
+        tags = await _load_persisted_tags(key, artist, track)
+        if tags is not None:
+            return tags
+    try:
+        js = await lastfm_get("track.getTopTags", params, priority)
+        tags = js.get("toptags", {}).get("tag", [])
+        tags = [t.get("name", "").lower() for t in tags if isinstance(t, dict)]
+    except Exception as e:
+        print(f"[Last.fm] 태그 조회 실패 ({artist} - {track}): {e}")
+        return []
+    if fresh and not js.get("error"):
+        try:
+            await asyncio.to_thread(metadata_store.upsert_lastfm_tags, [(artist, track, tags)])
+        except Exception as e:
+            print(f"[Last.fm] 태그 DB 저장 실패: {e}")
+    return tags
+
+
+async def lf_similar_tracks(artist: str, track: str, limit=20, priority: int = PRIORITY_CRITICAL) -> List[Dict]:
+    try:
+        js = await lastfm_get("track.getSimilar", {"artist": artist, "track": track, "limit": limit}, priority)
+        return [{"name": it.get("name"), "artist": it.get("artist", {}).get("name")}
+                for it in js.get("similartracks", {}).get("track", []) if it.get("name")]
+    except Exception as e:
+        print(f"[Last.fm] 유사 트랙 조회 실패 ({artist} - {track}): {e}")
+        return []
+
+
+async def lf_top_by_tag(tag: str, limit=30, priority: int = PRIORITY_NORMAL) -> List[Dict]:
+    try:
+        js = await lastfm_get("tag.getTopTracks", {"tag": tag, "limit": max(limit, LASTFM_TOP_TAG_FETCH)}, priority)
+        return [{"name": it.get("name"), "artist": it.get("artist", {}).get("name")}
+                for it in js.get("tracks", {}).get("track", [])[:limit] if it.get("name")]
+    except Exception as e:
+        print(f"[Last.fm] 태그별 트랙 조회 실패 ({tag}): {e}")
+        return []
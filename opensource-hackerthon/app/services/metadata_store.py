@@ -0,0 +1,146 @@
+"""트랙/아티스트/Last.fm 태그/Deezer 매칭 메타데이터의 SQLite 영구 저장소.
+
+재시작·배포 후에도 이미 본 카탈로그를 다시 조회하지 않도록 한다.
+모든 쓰기는 bulk upsert 이고, 읽기는 updated_at 기준 max_age 안의 행만 돌려준다.
+"""
+import json
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from app.core.database import SessionLocal, engine
+from app.models.metadata import TrackMeta, ArtistMeta, LastfmTag, DeezerMatch
+
+_CHUNK = 100  # SQLite 바인드 변수 제한(구버전 999개) 대비
+
+
+def norm(s: str) -> str:
+    """캐시 키용 정규화: 소문자 + 공백 정리"""
+    return " ".join((s or "").lower().split())
+
+
+def _now() -> int:
+    return int(time.time())
+
+
+def _chunks(seq: List, n: int = _CHUNK) -> Iterable[List]:
+    for i in range(0, len(seq), n):
+        yield seq[i:i+n]
+
+
+# ON CONFLICT 구문은 방언별 insert 가 필요 (DATABASE_URL 로 Postgres 도 가능)
+insert = postgresql.insert if engine.dialect.name == "postgresql" else sqlite.insert
+
+
+def _bulk_upsert(model, rows: List[Dict], keys: List[str]) -> int:
+    if not rows:
+        return 0
+    cols = [c.name for c in model.__table__.columns if c.name not in keys]
+    with SessionLocal() as db:
+        for chunk in _chunks(rows):
+            stmt = insert(model).values(chunk)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=keys,
+                set_={c: stmt.excluded[c] for c in cols},
+            )
+            db.execute(stmt)
+        db.commit()
+    return len(rows)
+
+
+# ====== Tracks / Artists ======
+def upsert_tracks(tracks: Dict[str, Dict], market: str) -> int:
+    """tracks: 트랙 ID -> get_track_info 형식 dict"""
+    now = _now()
+    rows = [{
+        "track_id": tid,
+        "market": market,
+        "name": t.get("name") or "Unknown Track",
+        "artists": t.get("artists") or "Unknown Artist",
+        "album": t.get("album"),
+        "album_image": t.get("album_image"),
+        "url": t.get("url"),
+        "popularity": t.get("popularity"),
+        "updated_at": now,
+    } for tid, t in tracks.items()]
+    return _bulk_upsert(TrackMeta, rows, ["track_id", "market"])
+
+
+def get_tracks(track_ids: List[str], market: str, max_age: float) -> Dict[str, Dict]:
+    if not track_ids:
+        return {}
+    since = _now() - int(max_age)
+    out = {}
+    with SessionLocal() as db:
+        for chunk in _chunks(list(dict.fromkeys(track_ids))):
+            q = select(TrackMeta).where(
+                TrackMeta.market == market,
+                TrackMeta.track_id.in_(chunk),
+                TrackMeta.updated_at >= since,
+            )
+            for row in db.execute(q).scalars():
+                out[row.track_id] = {
+                    "id": row.track_id,
+                    "name": row.name,
+                    "artists": row.artists,
+                    "album": row.album or "",
+                    "album_image": row.album_image or "",
+                    "url": row.url or f"https://open.spotify.com/track/{row.track_id}",
+                    "popularity": row.popularity or 0,
+                }
+    return out
+
+
+def upsert_artists(artists: Dict[str, str]) -> int:
+    """artists: 아티스트 ID -> 이름"""
+    now = _now()
+    rows = [{"artist_id": aid, "name": name, "updated_at": now} for aid, name in artists.items() if aid and name]
+    return _bulk_upsert(ArtistMeta, rows, ["artist_id"])
+
+
+# ====== Last.fm tags ======
+def upsert_lastfm_tags(items: List[Tuple[str, str, List[str]]]) -> int:
+    """items: (artist, track, tags) 목록"""
+    now = _now()
+    rows = {}
+    for artist, track, tags in items:
+        key = (norm(artist), norm(track))
+        rows[key] = {"artist": key[0], "track": key[1], "tags": json.dumps(tags, ensure_ascii=False), "updated_at": now}
+    return _bulk_upsert(LastfmTag, list(rows.values()), ["artist", "track"])
+
+
+def get_lastfm_tags(artist: str, track: str, max_age: float) -> Optional[List[str]]:
+    with SessionLocal() as db:
+        row = db.get(LastfmTag, (norm(artist), norm(track)))
+    if row is None or row.updated_at < _now() - max_age:
+        return None
+    return json.loads(row.tags)
+
+
+# ====== Deezer matches ======
+def upsert_deezer_matches(items: List[Tuple[str, str, Optional[Dict]]]) -> int:
+    """items: (artist, track, 매칭 결과 또는 None=매칭 없음)"""
+    now = _now()
+    rows = {}
+    for artist, track, match in items:
+        key = (norm(artist), norm(track))
+        rows[key] = {
+            "artist": key[0],
+            "track": key[1],
+            "found": match is not None,
+            "data": json.dumps(match, ensure_ascii=False) if match is not None else None,
+            "updated_at": now,
+        }
+    return _bulk_upsert(DeezerMatch, list(rows.values()), ["artist", "track"])
+
+
+def get_deezer_rows(pairs: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Tuple[Optional[Dict], int]]:
+    """정규화된 (artist, track) -> (매칭 결과 또는 None, updated_at). 나이 판단은 호출 쪽에서 한다."""
+    keys = list(dict.fromkeys((norm(a), norm(t)) for a, t in pairs))
+    out = {}
+    with SessionLocal() as db:
+        for chunk in _chunks(keys, _CHUNK // 2):
+            q = select(DeezerMatch).where(tuple_(DeezerMatch.artist, DeezerMatch.track).in_(chunk))
+            for row in db.execute(q).scalars():
+                out[(row.artist, row.track)] = (json.loads(row.data) if row.found else None, row.updated_at)
+    return out
@@ -0,0 +1,269 @@
+"""날씨·시간대 → 음악 분위기 규칙 엔진.
+
+규칙은 mood_rules.json (MOOD_RULES_FILE 로 변경 가능) 의 선언형 표로 관리한다.
+표는 위에서부터 처음 맞는 규칙이 선택되며, 로드할 때
+시간대 구간 × 날씨 플래그 조합 × 체감온도/풍속/습도 구간 격자로 미리 계산해 둔다.
+조회는 구간 계산(bisect) 몇 번과 격자 인덱싱뿐이다.
+
+규칙 조건 (when):
+  main: "rain"          날씨 main 에 문자열 포함
+  precip: "rain"        main 에 포함되거나 응답의 같은 이름 필드(rain/snow)가 있음
+  feels_ge / feels_gt / feels_lt / feels_le   체감온도 비교 (wind_*, humidity_* 도 동일)
+
+파일이 바뀌면 재시작 없이 다시 읽는다 (MOOD_RULES_CHECK_INTERVAL 초마다 mtime 확인).
+"""
+import os
+import json
+import time
+import threading
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy 미설치 환경
+    np = None
+
+MOOD_RULES_FILE = os.getenv("MOOD_RULES_FILE", os.path.join(os.path.dirname(__file__), "mood_rules.json"))
+MOOD_RULES_CHECK_INTERVAL = float(os.getenv("MOOD_RULES_CHECK_INTERVAL", "5"))
+
+NUMERIC = ("feels", "wind", "humidity")
+_DEFAULTS = {"feels": 18.0, "wind": 2.0, "humidity": 50.0}
+# 비교 연산 → (경계 종류, 경계를 넘은 쪽에서 참인지). 종류 0: v >= t 이면 넘음, 1: v > t 이면 넘음
+_OPS = {"ge": (0, True), "lt": (0, False), "gt": (1, True), "le": (1, False)}
+
+
+def _inputs(w: dict) -> Tuple[str, Dict[str, float]]:
+    main = (w.get("weather", [{}])[0].get("main", "Clear")).lower()
+    return main, {
+        "feels": float(w.get("main", {}).get("feels_like", _DEFAULTS["feels"])),
+        "wind": float(w.get("wind", {}).get("speed", _DEFAULTS["wind"])),
+        "humidity": float(w.get("main", {}).get("humidity", _DEFAULTS["humidity"])),
+    }
+
+
+def _split_cond(key: str) -> Tuple[str, str]:
+    var, _, op = key.rpartition("_")
+    if var not in NUMERIC or op not in _OPS:
+        raise ValueError(f"알 수 없는 조건: {key}")
+    return var, op
+
+
+class MoodTable:
+    """규칙 목록을 격자로 컴파일한 조회 테이블"""
+
+    def __init__(self, rules: List[Dict]):
+        if not rules:
+            raise ValueError("규칙이 비어 있음")
+        self.rules = rules
+        self.names = [r["rule"] for r in rules]
+        self.labels = {r["rule"]: r.get("label", r["rule"]) for r in rules}
+
+        # 날씨 플래그: 규칙이 쓰는 (main|precip, 값) 조건마다 1비트
+        preds = []
+        for r in rules:
+            for kind in ("main", "precip"):
+                v = (r.get("when") or {}).get(kind)
+                if v is not None and (kind, v) not in preds:
+                    preds.append((kind, v))
+        self.preds = preds
+
+        # 수치 조건의 경계값
+        bounds = {var: ([], []) for var in NUMERIC}
+        for r in rules:
+            for key, t in (r.get("when") or {}).items():
+                if key in ("main", "precip"):
+                    continue
+                var, op = _split_cond(key)
+                kind = _OPS[op][0]
+                if float(t) not in bounds[var][kind]:
+                    bounds[var][kind].append(float(t))
+        self.bounds = {var: (sorted(b0), sorted(b1)) for var, (b0, b1) in bounds.items()}
+
+        # 시간대 구간: 규칙의 시작/끝 시각으로 24시간을 나눔
+        cuts = sorted({h for r in rules for h in r["hours"]} | {0, 24})
+        self.hour_band = [bisect_right(cuts, h) - 1 for h in range(24)]
+        hour_reps = {}
+        for h, b in enumerate(self.hour_band):
+            hour_reps.setdefault(b, h)
+
+        reps = {var: self._band_reps(var) for var in NUMERIC}
+        self.shape = (len(hour_reps), 1 << len(preds)) + tuple(len(reps[var]) for var in NUMERIC)
+        grid = []
+        for hb in range(self.shape[0]):
+            for cls in range(self.shape[1]):
+                flags = {p: bool(cls >> i & 1) for i, p in enumerate(preds)}
+                for f in reps["feels"]:
+                    for wd in reps["wind"]:
+                        for hu in reps["humidity"]:
+                            idx = self._first_match(hour_reps[hb], flags, {"feels": f, "wind": wd, "humidity": hu})
+                            if idx is None:
+                                raise ValueError(f"어떤 규칙에도 맞지 않는 경우가 있음: hour={hour_reps[hb]} flags={flags} feels={f} wind={wd} humidity={hu}")
+                            grid.append(idx)
+        self.grid = grid
+        self.grid_np = np.array(grid, dtype=np.int16).reshape(self.shape) if np is not None else None
+
+    def band(self, var: str, v: float) -> int:
+        b0, b1 = self.bounds[var]
+        return bisect_right(b0, v) + bisect_left(b1, v)
+
+    def _band_reps(self, var: str) -> List[float]:
+        """구간마다 그 구간에 속하는 대표값 하나"""
+        ts = sorted(set(self.bounds[var][0]) | set(self.bounds[var][1]))
+        if not ts:
+            return [_DEFAULTS[var]]
+        cands = [ts[0] - 1.0] + ts + [(a + b) / 2 for a, b in zip(ts, ts[1:])] + [ts[-1] + 1.0]
+        reps = {}
+        for v in sorted(cands):
+            reps.setdefault(self.band(var, v), v)
+        return [reps[i] for i in range(len(reps))]
+
+    def _first_match(self, hour: int, flags: Dict, nums: Dict[str, float]) -> Optional[int]:
+        for i, r in enumerate(self.rules):
+            start, end = r["hours"]
+            if not (start <= hour < end):
+                continue
+            ok = True
+            for key, t in (r.get("when") or {}).items():
+                if key in ("main", "precip"):
+                    ok = flags[(key, t)]
+                else:
+                    var, op = _split_cond(key)
+                    v, t = nums[var], float(t)
+                    ok = {"ge": v >= t, "gt": v > t, "lt": v < t, "le": v <= t}[op]
+                if not ok:
+                    break
+            if ok:
+                return i
+        return None
+
+    def weather_class(self, main: str, w: dict) -> int:
+        cls = 0
+        for i, (kind, v) in enumerate(self.preds):
+            if v in main or (kind == "precip" and w.get(v)):
+                cls |= 1 << i
+        return cls
+
+    def lookup(self, hour: int, cls: int, nums: Dict[str, float]) -> int:
+        _, nc, nf, nw, nh = self.shape
+        idx = ((self.hour_band[hour] * nc + cls) * nf + self.band("feels", nums["feels"])) * nw
+        idx = (idx + self.band("wind", nums["wind"])) * nh + self.band("humidity", nums["humidity"])
+        return self.grid[idx]
+
+
+_lock = threading.Lock()
+_table: Optional[MoodTable] = None
+_mtime = None
+_checked_at = 0.0
+_stats = {"reloads": 0, "reload_errors": 0, "loaded_at": None, "last_error": None}
+
+
+def load(path: str = None) -> MoodTable:
+    """규칙 파일을 읽어 컴파일하고 현재 테이블로 교체. 실패하면 예외 (기존 테이블 유지)"""
+    global _table
+    path = path or MOOD_RULES_FILE
+    with open(path, encoding="utf-8") as f:
+        rules = json.load(f)
+    table = MoodTable(rules)
+    with _lock:
+        _table = table
+        _stats["reloads"] += 1
+        _stats["loaded_at"] = int(time.time())
+    return table
+
+
+def table() -> MoodTable:
+    """현재 테이블. 파일이 바뀌었으면 다시 컴파일"""
+    global _checked_at, _mtime
+    now = time.monotonic()
+    if _table is not None and now - _checked_at < MOOD_RULES_CHECK_INTERVAL:
+        return _table
+    _checked_at = now
+    try:
+        mtime = os.path.getmtime(MOOD_RULES_FILE)
+        if _table is None or mtime != _mtime:
+            # 실패해도 같은 파일을 매번 다시 읽지 않도록 먼저 기록
+            _mtime = mtime
+            load()
+            print(f"[mood_engine] 규칙 로드: {MOOD_RULES_FILE} ({len(_table.rules)}개)")
+    except Exception as e:
+        _stats["reload_errors"] += 1
+        _stats["last_error"] = str(e)
+        print(f"[mood_engine] 규칙 로드 실패, 기존 규칙 유지: {e}")
+        if _table is None:
+            raise
+    return _table
+
+
+def resolve(w: dict, hour: int) -> dict:
+    t = table()
+    main, nums = _inputs(w)
+    r = t.rules[t.lookup(hour, t.weather_class(main, w), nums)]
+    return {"rule": r["rule"], "keywords": list(r["keywords"])}
+
+
+def label(rule: str) -> str:
+    """규칙 이름의 한국어 표시명"""
+    return table().labels.get(rule, rule)
+
+
+def all_rules() -> List[Dict]:
+    return [{"rule": r["rule"], "keywords": list(r["keywords"])} for r in table().rules]
+
+
+# ====== 일괄 평가 (용량 산정용) ======
+def evaluate_arrays(hours, classes, feels, winds, humidity):
+    """NumPy 배열 입력을 한 번에 규칙 인덱스 배열로 변환"""
+    t = table()
+    hours = np.asarray(hours, dtype=np.int64)
+    bands = []
+    for var, v in (("feels", feels), ("wind", winds), ("humidity", humidity)):
+        b0, b1 = t.bounds[var]
+        v = np.asarray(v, dtype=np.float64)
+        bands.append(np.searchsorted(b0, v, side="right") + np.searchsorted(b1, v, side="left"))
+    hb = np.asarray(t.hour_band, dtype=np.int64)[hours]
+    return t.grid_np[hb, np.asarray(classes, dtype=np.int64), bands[0], bands[1], bands[2]]
+
+
+def replay(observations: Iterable[Tuple[int, dict]]) -> dict:
+    """(시각, 날씨 응답) 관측 목록(예: 하루치 × 모든 격자)을 평가해 규칙별·시간별 분포를 반환"""
+    t = table()
+    hours, classes, feels, winds, humidity = [], [], [], [], []
+    for hour, w in observations:
+        main, nums = _inputs(w)
+        hours.append(hour)
+        classes.append(t.weather_class(main, w))
+        feels.append(nums["feels"])
+        winds.append(nums["wind"])
+        humidity.append(nums["humidity"])
+    if not hours:
+        return {"observations": 0, "distinct_rules": 0, "rules": {}, "by_hour": {}}
+
+    if np is not None:
+        idx = evaluate_arrays(hours, classes, feels, winds, humidity).tolist()
+    else:
+        idx = [t.lookup(h, c, {"feels": f, "wind": wd, "humidity": hu})
+               for h, c, f, wd, hu in zip(hours, classes, feels, winds, humidity)]
+
+    rules = Counter(t.names[i] for i in idx)
+    by_hour: Dict[int, Counter] = {}
+    for h, i in zip(hours, idx):
+        by_hour.setdefault(h, Counter())[t.names[i]] += 1
+    return {
+        "observations": len(idx),
+        "distinct_rules": len(rules),
+        "rules": dict(rules.most_common()),
+        "by_hour": {h: dict(c) for h, c in sorted(by_hour.items())},
+    }
+
+
+def stats() -> dict:
+    t = _table
+    return {
+        **_stats,
+        "file": MOOD_RULES_FILE,
+        "rules": len(t.rules) if t else 0,
+        "grid_shape": list(t.shape) if t else None,
+        "grid_cells": len(t.grid) if t else 0,
+    }
@@ -0,0 +1,200 @@
+"""무드 규칙별 후보 트랙 풀.
+
+같은 무드 규칙이면 모든 사용자가 같은 키워드로 같은 플레이리스트를 검색하므로
+(규칙, market) 마다 플레이리스트 후보 트랙 ID를 모아 두고, 트랙 메타데이터도 미리 캐시에 올려 둔다.
+사용자 요청은 개인화 랭킹만 하면 된다.
+
+- 풀은 사용자와 무관한 공용 데이터이므로 항상 앱 토큰으로만 만든다 (앱 자격 증명이 없으면 풀을 쓰지 않음)
+- 기본은 지연 생성: 풀이 없으면 첫 요청이 만들고(같은 규칙 동시 요청은 한 번만), 오래된 풀은 일단 쓰고 뒤에서 갱신한다
+- 만들다 실패해도 MOOD_POOL_MIN_PARTIAL 곡 이상 모였으면 그 후보를 돌려주고, 아니면 None 으로 일반 검색 경로에 맡긴다
+- 백그라운드 워커 (MOOD_POOL_WORKER_ENABLED=1 일 때): 모든 규칙 × market 풀을 주기적으로 새로 고친다.
+  사용자 요청과 같은 Spotify 호출 한도를 쓰므로 빌드 시작을 MOOD_POOL_STAGGER 초 간격으로 나눈다
+"""
+import os
+import time
+import asyncio
+from typing import Dict, List, Optional, Tuple
+from app.core.singleflight import AsyncSingleFlight
+from app.services import spotify_async, mood_engine, app_token
+
+MOOD_POOL_ENABLED = os.getenv("MOOD_POOL_ENABLED", "1") == "1"
+MOOD_POOL_TTL = float(os.getenv("MOOD_POOL_TTL", "3600"))
+MOOD_POOL_INTERVAL = float(os.getenv("MOOD_POOL_INTERVAL", "900"))
+MOOD_POOL_MARKETS = [m.strip() for m in os.getenv("MOOD_POOL_MARKETS", "KR").split(",") if m.strip()]
+MOOD_POOL_CONCURRENCY = int(os.getenv("MOOD_POOL_CONCURRENCY", "2"))
+# 생성이 중간에 실패했을 때 모은 후보를 그대로 쓸 최소 곡 수
+MOOD_POOL_MIN_PARTIAL = int(os.getenv("MOOD_POOL_MIN_PARTIAL", "50"))
+MOOD_POOL_WORKER_ENABLED = os.getenv("MOOD_POOL_WORKER_ENABLED", "0") == "1"
+MOOD_POOL_STAGGER = float(os.getenv("MOOD_POOL_STAGGER", "5"))
+
+_pools: Dict[Tuple[str, str], Dict] = {}
+_flight = AsyncSingleFlight()
+_task: Optional[asyncio.Task] = None
+_refreshing: set = set()
+_bg_tasks: set = set()
+_stats = {"hits": 0, "stale_hits": 0, "misses": 0, "builds": 0, "build_failures": 0, "last_run_at": None}
+
+
+class PoolBuildError(RuntimeError):
+    """풀 생성 실패. track_ids 는 실패 전까지 모은 후보"""
+
+    def __init__(self, msg: str, track_ids: List[str]):
+        super().__init__(msg)
+        self.track_ids = track_ids
+
+
+async def build(rule: str, keywords: List[str], market: str, tok: str) -> Dict:
+    """키워드로 후보를 모으고 메타데이터를 캐시에 올린 뒤 풀을 교체"""
+    ids, meta = await spotify_async.collect_playlist_candidates(tok, keywords, market)
+    if not ids:
+        _stats["build_failures"] += 1
+        raise PoolBuildError(f"'{rule}' 후보 없음", [])
+    # track_meta 캐시를 데워 두면 사용자 랭킹 단계에서 /tracks 호출이 거의 없어짐
+    try:
+        await spotify_async.get_track_info(tok, ids, market=market)
+    except Exception as e:
+        _stats["build_failures"] += 1
+        raise PoolBuildError(f"'{rule}' 메타데이터 준비 실패: {e}", ids) from e
+    pool = {
+        "rule": rule,
+        "keywords": list(keywords),
+        "market": market,
+        "track_ids": ids,
+        "playlists": meta["playlists_searched"],
+        "built_at": time.time(),
+    }
+    _pools[(rule, market)] = pool
+    _stats["builds"] += 1
+    print(f"[mood_pool] '{rule}' ({market}) 풀 갱신: {len(ids)}곡")
+    return pool
+
+
+def _build_once(rule: str, keywords: List[str], market: str, tok: str):
+    return _flight.do((rule, market), lambda: build(rule, keywords, market, tok))
+
+
+def _refresh_in_background(rule: str, keywords: List[str], market: str) -> None:
+    key = (rule, market)
+    if key in _refreshing:
+        return
+    _refreshing.add(key)
+
+    async def run():
+        try:
+            await _build_once(rule, keywords, market, await app_token.get_token())
+        except Exception as e:
+            print(f"[mood_pool] '{rule}' 백그라운드 갱신 실패: {e}")
+        finally:
+            _refreshing.discard(key)
+
+    t = asyncio.ensure_future(run())
+    _bg_tasks.add(t)
+    t.add_done_callback(_bg_tasks.discard)
+
+
+async def candidates(rule: str, keywords: List[str], market: str) -> Optional[List[str]]:
+    """규칙의 후보 트랙 ID. 풀을 쓸 수 없으면 None (호출 쪽에서 사용자 토큰으로 직접 검색).
+    풀 생성이 검색 뒤에 실패해도 MOOD_POOL_MIN_PARTIAL 곡 이상 모였으면 그 후보를 돌려줌"""
+    if not MOOD_POOL_ENABLED or not app_token.configured():
+        return None
+    pool = _pools.get((rule, market))
+    if pool is not None and pool["keywords"] == list(keywords):
+        if time.time() - pool["built_at"] <= MOOD_POOL_TTL:
+            _stats["hits"] += 1
+        else:
+            _stats["stale_hits"] += 1
+            _refresh_in_background(rule, keywords, market)
+        return pool["track_ids"]
+
+    _stats["misses"] += 1
+    try:
+        tok = await app_token.get_token()
+    except Exception as e:
+        print(f"[mood_pool] 앱 토큰 발급 실패: {e}")
+        return None
+    try:
+        pool = await _build_once(rule, keywords, market, tok)
+    except PoolBuildError as e:
+        if len(e.track_ids) >= max(1, MOOD_POOL_MIN_PARTIAL):
+            print(f"[mood_pool] {e} (모은 후보 {len(e.track_ids)}곡 사용)")
+            return e.track_ids
+        print(f"[mood_pool] {e} (모은 후보 {len(e.track_ids)}곡 → 직접 검색)")
+        return None
+    except Exception as e:
+        print(f"[mood_pool] '{rule}' 풀 생성 실패: {e}")
+        return None
+    return pool["track_ids"]
+
+
+async def refresh_all(force: bool = False, stagger: float = 0.0) -> dict:
+    """앱 토큰으로 모든 규칙 × market 풀을 갱신 (TTL 의 80% 가 지나지 않은 풀은 건너뜀).
+    stagger 초마다 하나씩 빌드를 시작해 호출이 한꺼번에 몰리지 않게 함"""
+    await app_token.get_token()  # 자격 증명 오류는 여기서 바로 전달
+    sem = asyncio.Semaphore(max(1, MOOD_POOL_CONCURRENCY))
+    done = failed = 0
+    due = []
+    for r in mood_engine.all_rules():
+        for m in MOOD_POOL_MARKETS:
+            pool = _pools.get((r["rule"], m))
+            if not force and pool and pool["keywords"] == r["keywords"] and time.time() - pool["built_at"] < MOOD_POOL_TTL * 0.8:
+                continue
+            due.append((r["rule"], r["keywords"], m))
+
+    async def one(i: int, rule: str, keywords: List[str], market: str):
+        nonlocal done, failed
+        await asyncio.sleep(i * stagger)
+        async with sem:
+            try:
+                # 간격을 두고 시작하므로 빌드마다 토큰을 다시 받음 (캐시된 토큰이면 호출 없음)
+                await _build_once(rule, keywords, market, await app_token.get_token())
+                done += 1
+            except Exception as e:
+                failed += 1
+                print(f"[mood_pool] '{rule}' 갱신 실패: {e}")
+
+    await asyncio.gather(*(one(i, *d) for i, d in enumerate(due)))
+    _stats["last_run_at"] = int(time.time())
+    return {"refreshed": done, "failed": failed}
+
+
+async def _loop() -> None:
+    while True:
+        try:
+            res = await refresh_all(stagger=MOOD_POOL_STAGGER)
+            print(f"[mood_pool] 주기 갱신: {res}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[mood_pool] 주기 갱신 오류: {e}")
+        await asyncio.sleep(MOOD_POOL_INTERVAL)
+
+
+def start() -> None:
+    global _task
+    if not (MOOD_POOL_ENABLED and MOOD_POOL_WORKER_ENABLED) or not app_token.configured() or (_task and not _task.done()):
+        return
+    _task = asyncio.create_task(_loop())
+
+
+async def stop() -> None:
+    global _task
+    if _task is None:
+        return
+    _task.cancel()
+    try:
+        await _task
+    except asyncio.CancelledError:
+        pass
+    _task = None
+
+
+def stats() -> dict:
+    now = time.time()
+    return {
+        **_stats,
+        "pools": len(_pools),
+        "fresh": sum(1 for p in _pools.values() if now - p["built_at"] <= MOOD_POOL_TTL),
+        "tracks": sum(len(p["track_ids"]) for p in _pools.values()),
+        "worker_enabled": MOOD_POOL_WORKER_ENABLED,
+        "worker": _task is not None and not _task.done(),
+    }
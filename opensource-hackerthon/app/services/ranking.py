@@ -0,0 +1,162 @@
+"""플레이리스트 후보 랭킹 엔진.
+
+점수 = 1.0*아티스트 겹침 + 0.2*인기도 + 0.1*제목 토큰 최대 Jaccard
+후보 × 사용자 곡 Jaccard 는 토큰 역색인(토큰 → 그 토큰을 가진 사용자 곡)으로
+토큰을 하나라도 공유하는 (후보, 사용자 곡) 쌍만 NumPy 로 세어 계산한다.
+후보 × 어휘 밀집 행렬을 만들지 않으므로 비용은 후보 수가 아니라 겹치는 쌍 수에 비례한다.
+토큰은 전역 정수 ID 로 바꿔 두고(제목별 캐시), 사용자 쪽 역색인은 사용자 곡 제목 목록별로 캐시하므로
+요청마다 하는 일은 후보 열을 훑는 것뿐이다.
+NumPy 가 없으면 같은 결과를 내는 순수 파이썬 루프로 동작한다.
+"""
+from collections import Counter
+from functools import lru_cache
+from itertools import chain
+from typing import Dict, FrozenSet, List, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy 미설치 환경
+    np = None
+
+MAX_PER_ARTIST = 2
+# 전역 토큰 ID 표가 이 크기를 넘으면 관련 캐시와 함께 비움
+MAX_TOKEN_IDS = 500_000
+
+_token_ids: Dict[str, int] = {}
+
+
+@lru_cache(maxsize=100_000)
+def _name_tokens(s: str) -> FrozenSet[str]:
+    return frozenset(x for x in (s or "").lower().replace(",", " ").split() if len(x) > 1)
+
+
+def _pick_diverse(order, cand_meta: List[Dict], take: int) -> List[Dict]:
+    # 아티스트 다양성(아티스트당 최대 2곡)
+    picked, artist_cnt = [], Counter()
+    for i in order:
+        t = cand_meta[i]
+        a = t["artists"]
+        if artist_cnt[a] >= MAX_PER_ARTIST:
+            continue
+        picked.append(t)
+        artist_cnt[a] += 1
+        if len(picked) >= take:
+            break
+    return picked
+
+
+def _scores_python(cand_meta: List[Dict], user_meta: List[Dict]) -> List[float]:
+    user_artist_names = {um["artists"] for um in user_meta}
+    user_title_tokens = [_name_tokens(um["name"]) for um in user_meta if um.get("name")]
+
+    scores = []
+    for t in cand_meta:
+        popularity = (t.get("popularity") or 0) / 100.0
+        artist_overlap = 1.0 if t["artists"] in user_artist_names else 0.0
+        title_sim = 0.0
+        tok_t = _name_tokens(t["name"])
+        if tok_t and user_title_tokens:
+            # 최대 Jaccard
+            for utok in user_title_tokens:
+                if not utok:
+                    continue
+                inter = len(tok_t & utok)
+                if inter == 0:
+                    continue
+                union = len(tok_t | utok)
+                title_sim = max(title_sim, inter/union)
+        scores.append(1.0*artist_overlap + 0.2*popularity + 0.1*title_sim)
+    return scores
+
+
+@lru_cache(maxsize=100_000)
+def _name_token_ids(s: str) -> Tuple[int, ...]:
+    """제목 토큰 집합의 전역 정수 ID"""
+    return tuple(_token_ids.setdefault(w, len(_token_ids)) for w in _name_tokens(s))
+
+
+@lru_cache(maxsize=1024)
+def _user_index(user_names: Tuple[str, ...]):
+    """사용자 곡 제목 목록의 토큰 역색인.
+    lut[전역 토큰 ID] = 어휘 열 번호(-1: 사용자 곡에 없음), 열 c 를 가진 사용자 곡은 user_rows[indptr[c]:indptr[c + 1]]"""
+    user_ids = [_name_token_ids(s) for s in user_names]
+    vocab: Dict[int, int] = {}
+    for ids in user_ids:
+        for w in ids:
+            vocab.setdefault(w, len(vocab))
+    owners: List[List[int]] = [[] for _ in vocab]
+    for r, ids in enumerate(user_ids):
+        for w in ids:
+            owners[vocab[w]].append(r)
+    lut = np.full(max(vocab, default=-1) + 1, -1, dtype=np.int64)
+    lut[list(vocab)] = list(vocab.values())
+    deg = np.array([len(o) for o in owners], dtype=np.int64)
+    indptr = np.concatenate(([0], np.cumsum(deg)))
+    user_rows = np.fromiter(chain.from_iterable(owners), dtype=np.int64, count=int(indptr[-1]))
+    u_size = np.array([len(ids) for ids in user_ids], dtype=np.float64)
+    return lut, deg, indptr, user_rows, u_size
+
+
+def _title_sim(names: List[str], user_names: Tuple[str, ...]):
+    """후보별 사용자 곡과의 최대 제목 Jaccard"""
+    n = len(names)
+    title_sim = np.zeros(n, dtype=np.float64)
+    lut, deg, indptr, user_rows, u_size = _user_index(user_names)
+    if not len(user_rows):
+        return title_sim
+
+    cand_ids = [_name_token_ids(s) for s in names]
+    c_len = np.fromiter(map(len, cand_ids), dtype=np.int64, count=n)
+    flat = np.fromiter(chain.from_iterable(cand_ids), dtype=np.int64, count=int(c_len.sum()))
+    rows = np.repeat(np.arange(n, dtype=np.int64), c_len)
+    # 사용자 쪽 표보다 나중에 생긴 토큰 ID 는 사용자 곡에 없는 토큰
+    inside = flat < len(lut)
+    cols = np.full(len(flat), -1, dtype=np.int64)
+    cols[inside] = lut[flat[inside]]
+    hit = cols >= 0
+    rows, cols = rows[hit], cols[hit]
+    if not len(rows):
+        return title_sim
+
+    # 좌표마다 그 토큰을 가진 사용자 곡으로 펼쳐 (후보, 사용자곡) 쌍을 만듦
+    m = len(u_size)
+    rep = deg[cols]
+    total = int(rep.sum())
+    offs = np.arange(total, dtype=np.int64) - np.repeat(np.cumsum(rep) - rep, rep)
+    pair_c = np.repeat(rows, rep)
+    pair_u = user_rows[np.repeat(indptr[cols], rep) + offs]
+    # 같은 쌍이 나온 횟수 = 교집합 크기
+    keys, inter = np.unique(pair_c * m + pair_u, return_counts=True)
+    pc, pu = np.divmod(keys, m)
+    inter = inter.astype(np.float64)
+    jac = inter / (c_len[pc] + u_size[pu] - inter)
+    np.maximum.at(title_sim, pc, jac)
+    return title_sim
+
+
+def _scores_numpy(cand_meta: List[Dict], user_meta: List[Dict]):
+    if len(_token_ids) > MAX_TOKEN_IDS:
+        _token_ids.clear()
+        _name_token_ids.cache_clear()
+        _user_index.cache_clear()
+    user_artist_names = {um["artists"] for um in user_meta}
+    user_names = tuple(um["name"] for um in user_meta if um.get("name"))
+
+    n = len(cand_meta)
+    popularity = np.fromiter((t.get("popularity") or 0 for t in cand_meta), dtype=np.float64, count=n) / 100.0
+    artist_overlap = np.fromiter((t["artists"] in user_artist_names for t in cand_meta), dtype=np.float64, count=n)
+    title_sim = _title_sim([t["name"] for t in cand_meta], user_names)
+    return 1.0*artist_overlap + 0.2*popularity + 0.1*title_sim
+
+
+def score_and_pick(cand_meta: List[Dict], user_meta: List[Dict], take: int = 30) -> List[Dict]:
+    """후보를 점수 내림차순(동점은 입력 순서)으로 정렬한 뒤 아티스트 다양성 제한을 적용"""
+    if not cand_meta:
+        return []
+    if np is not None:
+        scores = _scores_numpy(cand_meta, user_meta)
+        order = np.argsort(-scores, kind="stable").tolist()
+    else:
+        scores = _scores_python(cand_meta, user_meta)
+        order = sorted(range(len(cand_meta)), key=lambda i: scores[i], reverse=True)
+    return _pick_diverse(order, cand_meta, take)
@@ -0,0 +1,383 @@
+"""Spotify Web API 호출 (async).
+
+API 주소·속도 제한·응답 변환은 app.services.spotify 와 공유한다.
+모든 호출이 app.core.http 의 keep-alive 되는 공용 Spotify 클라이언트를 공유하므로
+요청마다 TCP/TLS 핸드셰이크를 반복하지 않고 워커 스레드도 막지 않는다.
+"""
+import os
+import random
+import asyncio
+from typing import List, Dict, Tuple, Optional, Callable, Awaitable, Any
+import httpx
+from app.core import http
+from app.core.ratelimit import retry_after_seconds
+from app.services.spotify import API, _h, _track_info, limiter
+from app.services import track_meta, ranking
+
+# recommend_by_weather 팬아웃 단계: 동시 호출 수와 단계별 마감 시간(초)
+FANOUT_CONCURRENCY = int(os.getenv("SPOTIFY_FANOUT_CONCURRENCY", "8"))
+STAGE_DEADLINE = float(os.getenv("SPOTIFY_STAGE_DEADLINE", "4.0"))
+
+
+class SpotifyAuthError(RuntimeError):
+    """토큰이 거부됨 (status: HTTP 상태 코드). token_manager.with_token 이 갱신 후 재시도할지 판단할 때 씀"""
+
+    def __init__(self, status: int = 401):
+        super().__init__(f"{status} Unauthorized")
+        self.status = status
+
+
+async def api_request(method:str, url:str, tok:str, **kw) -> httpx.Response:
+    """토큰 버킷을 거쳐 호출하고 429 면 Retry-After/지터 백오프 후 재시도"""
+    attempt = 0
+    while True:
+        await limiter.acquire_async(tok)
+        r = await http.client("spotify").request(method, url, headers=_h(tok), **kw)
+        if r.status_code != 429:
+            return r
+        delay = limiter.on_429(tok, retry_after_seconds(r.headers), attempt)
+        if delay is None:
+            return r
+        print(f"[spotify] 429 Too Many Requests, 재시도 {attempt + 1}/{limiter.max_retries}")
+        limiter.record_backoff(delay)
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+async def _fan_out(calls: List[Callable[[], Awaitable[Any]]], concurrency: int, deadline: float) -> List[Any]:
+    """calls 를 최대 concurrency 개씩 동시에 실행하고 입력 순서대로 결과를 반환.
+    실패한 호출은 예외 객체, deadline 안에 끝나지 않은 호출은 asyncio.TimeoutError 가 들어간다."""
+    if not calls:
+        return []
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(fn):
+        async with sem:
+            return await fn()
+
+    tasks = [asyncio.ensure_future(run(fn)) for fn in calls]
+    try:
+        done, pending = await asyncio.wait(tasks, timeout=deadline)
+    finally:
+        for t in tasks:
+            if not t.done():
+                t.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    results = []
+    for t in tasks:
+        if t not in done:
+            results.append(asyncio.TimeoutError(f"deadline {deadline}s"))
+        elif t.exception() is not None:
+            results.append(t.exception())
+        else:
+            results.append(t.result())
+    return results
+
+
+async def me_recent(tok:str, limit:int=50) -> List[str]:
+    r = await api_request("GET", f"{API}/me/player/recently-played", tok, params={"limit":limit})
+    if r.status_code == 204: return []
+    if r.status_code == 401:
+        raise SpotifyAuthError(401)
+    r.raise_for_status()
+    return [i["track"]["id"] for i in r.json().get("items",[]) if i.get("track") and i["track"].get("id")]
+
+async def me_top(tok:str, time_range:str="short_term", limit:int=50) -> List[str]:
+    r = await api_request("GET", f"{API}/me/top/tracks", tok, params={"time_range":time_range,"limit":limit})
+    if r.status_code == 401:
+        raise SpotifyAuthError(401)
+    r.raise_for_status()
+    return [t["id"] for t in r.json().get("items",[]) if t.get("id")]
+
+async def get_spotify_recommendations(tok:str, seed_tracks:List[str], market:str="KR", limit:int=50) -> List[str]:
+    if not seed_tracks:
+        return []
+    seeds = seed_tracks[:5]
+    try:
+        params = {"seed_tracks": ",".join(seeds), "limit": limit, "market": market}
+        r = await api_request("GET", f"{API}/recommendations", tok, params=params)
+        if r.status_code == 401:
+            raise SpotifyAuthError(401)
+        r.raise_for_status()
+        tracks = r.json().get("tracks", [])
+        return [t["id"] for t in tracks if t and t.get("id")]
+    except Exception as e:
+        print(f"[spotify] Spotify recommendations 실패: {e}")
+        return []
+
+async def get_related_artists(tok:str, artist_id:str) -> List[str]:
+    try:
+        r = await api_request("GET", f"{API}/artists/{artist_id}/related-artists", tok)
+        if r.is_success:
+            artists = r.json().get("artists", [])
+            return [a["id"] for a in artists[:5] if a and a.get("id")]
+    except Exception as e:
+        print(f"[spotify] 유사 아티스트 조회 실패: {e}")
+    return []
+
+async def get_artist_top_tracks(tok:str, artist_id:str, market:str="KR") -> List[str]:
+    try:
+        r = await api_request("GET", f"{API}/artists/{artist_id}/top-tracks", tok, params={"market": market})
+        if r.is_success:
+            tracks = r.json().get("tracks", [])
+            return [t["id"] for t in tracks if t and t.get("id")]
+    except Exception as e:
+        print(f"[spotify] 아티스트 인기곡 조회 실패: {e}")
+    return []
+
+async def get_artist_ids_from_tracks(tok:str, track_ids:List[str]) -> List[str]:
+    if not track_ids:
+        return []
+    artist_ids = []
+    for i in range(0, len(track_ids), 50):
+        chunk = track_ids[i:i+50]
+        try:
+            r = await api_request("GET", f"{API}/tracks", tok, params={"ids": ",".join(chunk)})
+            if r.is_success:
+                for t in r.json().get("tracks", []):
+                    if t and t.get("artists"):
+                        for artist in t["artists"]:
+                            if artist and artist.get("id"):
+                                artist_ids.append(artist["id"])
+        except Exception as e:
+            print(f"[spotify] 아티스트 ID 추출 실패: {e}")
+    return list(dict.fromkeys(artist_ids))
+
+async def playlist_search(tok:str, q:str, market:str="KR", limit:int=8) -> List[Dict]:
+    r = await api_request("GET", f"{API}/search", tok,
+                                params={"q":q,"type":"playlist","market":market,"limit":limit})
+    r.raise_for_status()
+    items = (r.json().get("playlists") or {}).get("items") or []
+    return [it for it in items if it]
+
+async def episode_search(tok:str, q:str, market:Optional[str]=None, limit:int=10) -> List[Dict]:
+    params = {"q":q,"type":"episode","limit":limit}
+    if market:
+        params["market"] = market
+    r = await api_request("GET", f"{API}/search", tok, params=params)
+    r.raise_for_status()
+    items = (r.json().get("episodes") or {}).get("items") or []
+    return [it for it in items if it]
+
+async def playlist_tracks(tok:str, pid:str, limit:int=100) -> List[str]:
+    ids=[]; url=f"{API}/playlists/{pid}/tracks"; params={"limit":limit}
+    while url:
+        r = await api_request("GET", url, tok, params=params)
+        if r.status_code in (401,403):
+            break
+        r.raise_for_status()
+        j=r.json()
+        for x in j.get("items", []) or []:
+            tr = x.get("track")
+            if not tr:
+                continue
+            tid = tr.get("id")
+            if tid:
+                ids.append(tid)
+        url = j.get("next"); params=None
+        if len(ids)>=600: break
+    return list(dict.fromkeys(ids))
+
+async def track_search(tok:str, q:str, market:str="KR", limit:int=50) -> List[str]:
+    r = await api_request("GET", f"{API}/search", tok,
+                                params={"q":q, "type":"track", "market":market, "limit":limit})
+    r.raise_for_status()
+    items = (r.json().get("tracks") or {}).get("items") or []
+    return [t["id"] for t in items if t and t.get("id")]
+
+async def get_track_info(tok: str, track_ids: List[str], market: str = "KR") -> List[Dict]:
+    if not track_ids:
+        return []
+    found, missing = track_meta.lookup(track_ids, market)
+    if missing:
+        persisted, missing = await asyncio.to_thread(track_meta.load_persisted, missing, market)
+        found.update(persisted)
+    fetched, raw = {}, []
+    print(f"[spotify] get_track_info 시작: {len(track_ids)}개 트랙 (캐시 {len(found)}개, 조회 {len(missing)}개), market={market}")
+    for start in range(0, len(missing), 50):
+        chunk = missing[start:start+50]
+        try:
+            params = {"ids": ",".join(chunk), "market": market}
+            r = await api_request("GET", f"{API}/tracks", tok, params=params)
+            if not r.is_success:
+                print(f"[spotify] API 오류: {r.status_code} - {r.text[:200]}")
+                continue
+            for t in r.json().get("tracks", []):
+                if t and t.get("id"):
+                    fetched[track_meta.request_id(t)] = _track_info(t)
+                    raw.append(t)
+        except Exception as e:
+            print(f"[spotify] get_track_info 에러: {e}")
+            continue
+    track_meta.store(fetched, market)
+    if fetched:
+        await asyncio.to_thread(track_meta.persist, fetched, market, raw)
+    found.update(fetched)
+    all_tracks = track_meta.ordered(track_ids, found)
+    print(f"[spotify] get_track_info 완료: {len(all_tracks)}개 트랙 로드")
+    return all_tracks
+
+async def _rank_playlist_by_user_similarity(tok:str, playlist_track_ids:List[str], user_track_ids:List[str], take:int=30, market:str="KR") -> List[Dict]:
+    if not playlist_track_ids or not user_track_ids:
+        return []
+    print(f"[spotify] 유사도 랭킹 시작: 후보 {len(playlist_track_ids)}개, 사용자 기록 {len(user_track_ids)}개")
+    cand_meta = await get_track_info(tok, playlist_track_ids, market=market)
+    user_meta = await get_track_info(tok, user_track_ids[:50], market=market)
+    picked = ranking.score_and_pick(cand_meta, user_meta, take)
+    print(f"[spotify] 유사도 랭킹 완료: {len(picked)}개 선택")
+    return picked
+
+async def create_playlist(tok: str, user_id: str, name: str, description: str = "", public: bool = False) -> str:
+    data = {"name": name, "description": description, "public": public}
+    r = await api_request("POST", f"{API}/users/{user_id}/playlists", tok, json=data)
+    if r.status_code == 401:
+        raise SpotifyAuthError(401)
+    r.raise_for_status()
+    playlist = r.json()
+    print(f"[spotify] 플레이리스트 생성 완료: {playlist['id']} - {name}")
+    return playlist["id"]
+
+async def add_tracks_to_playlist(tok: str, playlist_id: str, track_ids: List[str]):
+    if not track_ids:
+        return
+    url = f"{API}/playlists/{playlist_id}/tracks"
+    for i in range(0, len(track_ids), 100):
+        chunk = track_ids[i:i+100]
+        uris = [f"spotify:track:{tid}" for tid in chunk]
+        r = await api_request("POST", url, tok, json={"uris": uris})
+        if r.status_code == 401:
+            raise SpotifyAuthError(401)
+        r.raise_for_status()
+        print(f"[spotify] 플레이리스트에 {len(chunk)}개 트랙 추가 완료")
+
+async def _user_seeds(tok:str) -> List[str]:
+    seed_tracks = await me_recent(tok, 50)
+    print(f"  ✓ 최근 재생 기록: {len(seed_tracks)}개")
+    if not seed_tracks:
+        seed_tracks = await me_top(tok, "short_term", 50)
+        print(f"  ✓ Top tracks (대체): {len(seed_tracks)}개")
+    return seed_tracks
+
+async def collect_playlist_candidates(tok:str, keywords:List[str], market:str="KR",
+                                      concurrency:int=FANOUT_CONCURRENCY,
+                                      stage_deadline:float=STAGE_DEADLINE) -> Tuple[List[str], Dict]:
+    """키워드로 플레이리스트를 찾아 그 안의 트랙 ID(중복 제거)를 모은다. 사용자와 무관하므로 공유 가능"""
+    # 키워드 기반 플레이리스트 검색 (동시 실행)
+    searches = await _fan_out(
+        [lambda k=k: playlist_search(tok, k, market=market, limit=6) for k in keywords],
+        concurrency, stage_deadline,
+    )
+    pls_kr = []
+    search_timeouts = 0
+    for k, res in zip(keywords, searches):
+        if isinstance(res, asyncio.TimeoutError):
+            search_timeouts += 1
+            print(f"  ✗ '{k}' 검색 시간 초과")
+        elif isinstance(res, Exception):
+            print(f"  ✗ '{k}' 검색 실패: {res}")
+        else:
+            pls_kr += res
+            print(f"  ✓ '{k}' 검색: {len(res)}개")
+
+    # 플레이리스트 중복 제거
+    pl_dict = {p["id"]: p for p in pls_kr if p and p.get("id")}
+    pids = list(pl_dict.items())[:12]
+    print(f"\n  📋 총 {len(pids)}개 플레이리스트에서 트랙 수집 중...")
+
+    # 플레이리스트 내 트랙만 후보 (동시 실행, 늦은 플레이리스트는 제외)
+    fetched = await _fan_out(
+        [lambda pid=pid: playlist_tracks(tok, pid, 50) for pid, _ in pids],
+        concurrency, stage_deadline,
+    )
+    candidate_ids = []
+    track_timeouts = 0
+    for (pid, pl_info), tracks in zip(pids, fetched):
+        name = pl_info.get("name","Unknown")
+        owner = (pl_info.get("owner") or {}).get("display_name","Unknown")
+        if isinstance(tracks, asyncio.TimeoutError):
+            track_timeouts += 1
+            print(f"  ✗ '{name}' 시간 초과")
+        elif isinstance(tracks, Exception):
+            print(f"  ✗ 플레이리스트 수집 실패: {tracks}")
+        else:
+            candidate_ids.extend(tracks)
+            print(f"  ✓ '{name}' (by {owner}): {len(tracks)}곡")
+
+    return list(dict.fromkeys(candidate_ids)), {
+        "playlists_searched": len(pids),
+        "timeouts": {"search": search_timeouts, "playlist_tracks": track_timeouts},
+    }
+
+
+async def recommend_by_weather(tok:str, keywords:List[str], market:str="KR", take:int=30,
+                               seed_source:str="both",
+                               concurrency:int=FANOUT_CONCURRENCY,
+                               stage_deadline:float=STAGE_DEADLINE,
+                               candidate_pool:Optional[List[str]]=None,
+                               emit:Optional[Callable[[str, Any], None]]=None) -> Tuple[List[Dict], Dict]:
+    """candidate_pool 이 있으면(미리 모아 둔 무드별 후보) 플레이리스트 검색 단계를 건너뛴다.
+    emit(event, data) 가 주어지면 단계별 "progress" 와 랭킹된 곡마다 "track" 이벤트를 보낸다 (SSE 스트리밍용)"""
+    emit = emit or (lambda event, data: None)
+    print(f"\n{'='*60}")
+    print(f"[🎵 추천 시작] 날씨 키워드: {keywords}")
+    print(f"[🎵 추천 시작] 마켓: {market}, 목표 곡 수: {take}")
+    print(f"{'='*60}\n")
+
+    # 사용자 시드(최근 청취 우선)는 플레이리스트 수집과 동시에 진행
+    print(f"[1단계] 사용자 청취 기록 수집 중...")
+    seed_task = asyncio.ensure_future(_user_seeds(tok))
+    emit("progress", {"stage": "collect", "candidate_pool": candidate_pool is not None})
+    try:
+        if candidate_pool is not None:
+            print(f"\n[2단계] 미리 준비된 무드 후보 사용: {len(candidate_pool)}곡")
+            playlist_candidate_ids = list(candidate_pool)
+            collect_meta = {"playlists_searched": 0, "timeouts": {"search": 0, "playlist_tracks": 0}}
+        else:
+            print(f"\n[2단계] 날씨/무드 키워드 기반 플레이리스트 검색 중...")
+            playlist_candidate_ids, collect_meta = await collect_playlist_candidates(
+                tok, keywords, market, concurrency, stage_deadline,
+            )
+        seed_tracks = await seed_task
+    finally:
+        if not seed_task.done():
+            seed_task.cancel()
+
+    if not playlist_candidate_ids:
+        print("  ⚠️ 플레이리스트 기반 후보가 없습니다.")
+        return [], {"error":"playlist_empty"}
+
+    # 최근 들은 곡 제외
+    user_recent_set = set(seed_tracks)
+    playlist_candidate_ids = [tid for tid in playlist_candidate_ids if tid not in user_recent_set]
+    print(f"\n  📊 플레이리스트 후보(최근 제외): {len(playlist_candidate_ids)}개")
+    emit("progress", {"stage": "rank", "seeds": len(seed_tracks), "candidates": len(playlist_candidate_ids)})
+
+    if not playlist_candidate_ids:
+        return [], {"error":"no_candidates_after_filter"}
+
+    # 플레이리스트 내부에서 '사용자와 유사한' 곡 순위화
+    print(f"\n[3단계] 플레이리스트 내부 유사도 랭킹...")
+    if len(playlist_candidate_ids) > 500:
+        playlist_candidate_ids = random.sample(playlist_candidate_ids, 500)
+
+    ranked = await _rank_playlist_by_user_similarity(tok, playlist_candidate_ids, seed_tracks, take=take, market=market)
+
+    if not ranked:
+        return [], {"error":"ranking_failed"}
+
+    print(f"\n  ✓ 최종 선택: {len(ranked)}개")
+    for rank, t in enumerate(ranked):
+        emit("track", {"rank": rank, "track": t})
+    print(f"{'='*60}\n")
+
+    return ranked, {
+        "seeds_used": len(seed_tracks),
+        "total_candidates": len(playlist_candidate_ids),
+        "playlists_searched": collect_meta["playlists_searched"],
+        "method": "playlist_only_user_similarity",
+        "diversity": len(set(t['artists'] for t in ranked)),
+        "timeouts": collect_meta["timeouts"],
+        "candidate_pool": candidate_pool is not None,
+    }
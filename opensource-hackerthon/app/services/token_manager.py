@@ -0,0 +1,115 @@
+"""사용자 Spotify 토큰 관리.
+
+User.token_expires_at 을 기준으로 만료 직전에 미리 갱신하고,
+같은 사용자에 대한 동시 갱신은 한 번의 요청으로 합친다.
+"""
+import os
+import time
+import asyncio
+from typing import Awaitable, Callable, Optional, Sequence, TypeVar
+from app.core.singleflight import AsyncSingleFlight
+from app.models.user import User
+from app.services import user
+
+T = TypeVar("T")
+
+# 만료 몇 초 전부터 갱신할지
+TOKEN_REFRESH_MARGIN = int(os.getenv("TOKEN_REFRESH_MARGIN", "300"))
+
+_flight = AsyncSingleFlight()
+refreshed = 0
+failed = 0
+
+
+class TokenRefreshError(Exception):
+    pass
+
+
+def apply_tokens(u: User, token_data: dict) -> None:
+    """exchange_token / refresh_access_token 결과를 User 에 기록"""
+    u.access_token = token_data["access_token"]
+    if token_data.get("refresh_token"):
+        u.refresh_token = token_data["refresh_token"]
+    u.token_expires_at = int(time.time()) + int(token_data.get("expires_in") or 3600)
+
+
+def needs_refresh(u: User, margin: int = TOKEN_REFRESH_MARGIN) -> bool:
+    if not u.refresh_token:
+        return False
+    # 만료 시각을 모르는 기존 사용자는 한 번 갱신해서 기록
+    if not u.token_expires_at:
+        return True
+    return u.token_expires_at - time.time() <= margin
+
+
+async def fetch_refreshed(u: User) -> dict:
+    """refresh_token 으로 새 토큰을 받아 옴 (DB 는 건드리지 않음). 같은 사용자의 동시 호출은 하나의 요청을 공유"""
+    global refreshed, failed
+    if not u.refresh_token:
+        raise TokenRefreshError("refresh_token 없음")
+    try:
+        data = await _flight.do(
+            u.spotify_id,
+            lambda: asyncio.to_thread(user.refresh_access_token, u.refresh_token),
+        )
+    except Exception as e:
+        failed += 1
+        raise TokenRefreshError(str(e)) from e
+    if not data.get("access_token"):
+        failed += 1
+        raise TokenRefreshError("토큰 갱신 응답에 access_token 없음")
+    refreshed += 1
+    return data
+
+
+def _save(u: User, db, data: dict) -> None:
+    apply_tokens(u, data)
+    db.add(u)
+    db.commit()
+
+
+async def refresh(u: User, db) -> str:
+    """토큰을 갱신하고 DB에 저장 (저장은 스레드에서 실행해 이벤트 루프를 막지 않음)"""
+    data = await fetch_refreshed(u)
+    await asyncio.to_thread(_save, u, db, data)
+    return u.access_token
+
+
+async def valid_token(u: User, db) -> str:
+    """Spotify 호출 전에 사용할 유효한 access token"""
+    if needs_refresh(u):
+        try:
+            return await refresh(u, db)
+        except TokenRefreshError as e:
+            # 아직 만료 전이면 기존 토큰으로 계속 진행
+            if u.token_expires_at and u.token_expires_at > time.time():
+                print(f"[token_manager] 선제 갱신 실패, 기존 토큰 사용: {e}")
+                return u.access_token
+            raise
+    return u.access_token
+
+
+def status_of(e: BaseException) -> Optional[int]:
+    """예외의 HTTP 상태 코드 (SpotifyAuthError.status, httpx/requests 의 response.status_code). 없으면 None"""
+    status = getattr(e, "status", None)
+    if isinstance(status, int):
+        return status
+    return getattr(getattr(e, "response", None), "status_code", None)
+
+
+async def with_token(u: User, db, fn: Callable[[str], Awaitable[T]],
+                     retry_on: Sequence[int] = (401,)) -> T:
+    """유효한 토큰으로 fn 을 호출하고, 그래도 상태 코드가 retry_on 인 오류가 나면 한 번 갱신 후 재시도"""
+    token = await valid_token(u, db)
+    try:
+        return await fn(token)
+    except Exception as e:
+        if not u.refresh_token or status_of(e) not in retry_on:
+            raise
+        print(f"[token_manager] 인증 오류({e}) → 토큰 갱신 후 재시도")
+    token = await refresh(u, db)
+    return await fn(token)
+
+
+def stats() -> dict:
+    return {"refreshed": refreshed, "failed": failed, "coalesced": _flight.shared}
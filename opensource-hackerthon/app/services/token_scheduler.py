@@ -0,0 +1,166 @@
+"""사용자 토큰 백그라운드 선제 갱신.
+
+주기적으로 곧 만료될 사용자 토큰을 찾아 동시성 제한 안에서 미리 갱신한다.
+앱 수명 주기와 함께 시작·종료되며 기본으로 켜져 있다 (SPOTIFY_CLIENT_ID 가 없으면 시작하지 않음,
+TOKEN_SCHEDULER_ENABLED=0 으로 끌 수 있음).
+DB 조회와 저장은 스레드에서 실행해 이벤트 루프를 막지 않는다.
+요청 경로에서는 token_manager 가 같은 사용자 갱신을 single-flight 로 합치므로
+스케줄러와 요청이 겹쳐도 갱신 요청은 한 번만 나간다.
+"""
+import os
+import time
+import asyncio
+from typing import Dict, List, Optional
+from sqlalchemy import select, or_
+from app.core.database import SessionLocal
+from app.models.user import User
+from app.services import token_manager, user as user_service
+
+TOKEN_SCHEDULER_ENABLED = os.getenv("TOKEN_SCHEDULER_ENABLED", "1") == "1"
+TOKEN_SCHEDULER_INTERVAL = float(os.getenv("TOKEN_SCHEDULER_INTERVAL", "60"))
+# 요청 경로의 갱신 기준(TOKEN_REFRESH_MARGIN)보다 한 주기 먼저 갱신해야 요청이 갱신을 기다리지 않음
+TOKEN_SCHEDULER_WINDOW = int(os.getenv("TOKEN_SCHEDULER_WINDOW", str(token_manager.TOKEN_REFRESH_MARGIN + int(TOKEN_SCHEDULER_INTERVAL) * 2)))
+TOKEN_SCHEDULER_CONCURRENCY = int(os.getenv("TOKEN_SCHEDULER_CONCURRENCY", "4"))
+TOKEN_SCHEDULER_BATCH = int(os.getenv("TOKEN_SCHEDULER_BATCH", "200"))
+# 갱신에 실패한 사용자(refresh_token 폐기 등)는 한동안 건너뜀
+TOKEN_SCHEDULER_FAIL_BACKOFF = float(os.getenv("TOKEN_SCHEDULER_FAIL_BACKOFF", "900"))
+
+# _refresh_one 결과
+REFRESHED, SKIPPED, FAILED = "refreshed", "skipped", "failed"
+
+_task: Optional[asyncio.Task] = None
+_skip_until: Dict[int, float] = {}
+_stats = {
+    "runs": 0,
+    "refreshed": 0,
+    "skipped": 0,
+    "failed": 0,
+    "last_run_at": None,
+    "last_duration": None,
+    "last_due": 0,
+}
+
+
+def _due_user_ids(window: int, limit: int) -> List[int]:
+    """window 초 안에 만료되거나 만료 시각을 모르는 사용자 ID (만료가 가까운 순)"""
+    deadline = int(time.time()) + window
+    q = (
+        select(User.id)
+        .where(
+            User.refresh_token.isnot(None),
+            or_(User.token_expires_at.is_(None), User.token_expires_at <= deadline),
+        )
+        .order_by(User.token_expires_at)
+        .limit(limit)
+    )
+    with SessionLocal() as db:
+        ids = list(db.execute(q).scalars())
+    now = time.monotonic()
+    return [i for i in ids if _skip_until.get(i, 0) <= now]
+
+
+def _load_user(user_id: int) -> Optional[User]:
+    """갱신 판단에 쓸 사용자 (세션을 닫은 뒤에도 읽을 수 있게 분리된 객체)"""
+    with SessionLocal() as db:
+        u = db.get(User, user_id)
+        if u is not None:
+            db.expunge(u)
+        return u
+
+
+def _save_tokens(user_id: int, data: dict) -> None:
+    with SessionLocal() as db:
+        u = db.get(User, user_id)
+        if u is None:
+            return
+        token_manager.apply_tokens(u, data)
+        db.commit()
+
+
+async def _refresh_one(user_id: int, sem: asyncio.Semaphore) -> str:
+    """REFRESHED / SKIPPED(사용자 삭제, 또는 스캔 이후 요청 경로에서 이미 갱신됨) / FAILED"""
+    async with sem:
+        u = await asyncio.to_thread(_load_user, user_id)
+        if u is None or not token_manager.needs_refresh(u, TOKEN_SCHEDULER_WINDOW):
+            return SKIPPED
+        try:
+            data = await token_manager.fetch_refreshed(u)
+        except token_manager.TokenRefreshError as e:
+            print(f"[token_scheduler] 갱신 실패 user={u.spotify_id}: {e}")
+            _skip_until[user_id] = time.monotonic() + TOKEN_SCHEDULER_FAIL_BACKOFF
+            return FAILED
+        await asyncio.to_thread(_save_tokens, user_id, data)
+    _skip_until.pop(user_id, None)
+    return REFRESHED
+
+
+async def run_once(window: int = None, concurrency: int = None, limit: int = None) -> dict:
+    """만료 임박 사용자 한 배치를 갱신하고 이번 실행 결과를 반환"""
+    window = TOKEN_SCHEDULER_WINDOW if window is None else window
+    concurrency = TOKEN_SCHEDULER_CONCURRENCY if concurrency is None else concurrency
+    limit = TOKEN_SCHEDULER_BATCH if limit is None else limit
+
+    t0 = time.perf_counter()
+    ids = await asyncio.to_thread(_due_user_ids, window, limit)
+    sem = asyncio.Semaphore(max(1, concurrency))
+    results = await asyncio.gather(*(_refresh_one(i, sem) for i in ids))
+    ok = results.count(REFRESHED)
+    skipped = results.count(SKIPPED)
+    bad = results.count(FAILED)
+
+    _stats["runs"] += 1
+    _stats["refreshed"] += ok
+    _stats["skipped"] += skipped
+    _stats["failed"] += bad
+    _stats["last_run_at"] = int(time.time())
+    _stats["last_duration"] = round(time.perf_counter() - t0, 3)
+    _stats["last_due"] = len(ids)
+    if ids:
+        print(f"[token_scheduler] 대상 {len(ids)}명 → 갱신 {ok}, 건너뜀 {skipped}, 실패 {bad}")
+    return {"due": len(ids), "refreshed": ok, "skipped": skipped, "failed": bad}
+
+
+async def _loop(interval: float) -> None:
+    while True:
+        try:
+            await run_once()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[token_scheduler] 실행 오류: {e}")
+        await asyncio.sleep(interval)
+
+
+def start(interval: float = None) -> None:
+    global _task
+    if not TOKEN_SCHEDULER_ENABLED or (_task and not _task.done()):
+        return
+    # refresh_token 갱신에는 클라이언트 ID 가 필요
+    if not user_service.SPOTIFY_CLIENT_ID:
+        print("[token_scheduler] SPOTIFY_CLIENT_ID 없음 → 스케줄러를 시작하지 않음")
+        return
+    _task = asyncio.create_task(_loop(TOKEN_SCHEDULER_INTERVAL if interval is None else interval))
+
+
+async def stop() -> None:
+    global _task
+    if _task is None:
+        return
+    _task.cancel()
+    try:
+        await _task
+    except asyncio.CancelledError:
+        pass
+    _task = None
+
+
+def stats() -> dict:
+    return {
+        **_stats,
+        "enabled": TOKEN_SCHEDULER_ENABLED,
+        "running": _task is not None and not _task.done(),
+        "interval": TOKEN_SCHEDULER_INTERVAL,
+        "window": TOKEN_SCHEDULER_WINDOW,
+        "concurrency": TOKEN_SCHEDULER_CONCURRENCY,
+        "backing_off": sum(1 for t in _skip_until.values() if t > time.monotonic()),
+    }
@@ -0,0 +1,76 @@
+import os
+from typing import Dict, List, Tuple
+from app.core.cache import TTLCache
+from app.services import metadata_store
+
+# 프로세스 전체에서 공유하는 트랙 메타데이터 캐시 ((track_id, market) 단위)
+TRACK_META_CACHE_SIZE = int(os.getenv("TRACK_META_CACHE_SIZE", "50000"))
+TRACK_META_TTL = float(os.getenv("TRACK_META_TTL", str(24 * 3600)))
+# 메모리에 없으면 SQLite(track_meta 테이블)를 2차 저장소로 사용
+TRACK_META_PERSIST = os.getenv("TRACK_META_PERSIST", "1") == "1"
+TRACK_META_DB_MAX_AGE = float(os.getenv("TRACK_META_DB_MAX_AGE", str(30 * 24 * 3600)))
+
+_cache = TTLCache(maxsize=TRACK_META_CACHE_SIZE, ttl=TRACK_META_TTL)
+_db_hits = 0
+
+
+def lookup(track_ids: List[str], market: str) -> Tuple[Dict[str, Dict], List[str]]:
+    """캐시에 있는 트랙과 새로 조회해야 할 트랙 ID(중복 제거)를 나눠서 반환"""
+    found, missing = {}, []
+    for tid in dict.fromkeys(track_ids):
+        meta = _cache.get((tid, market))
+        if meta is None:
+            missing.append(tid)
+        else:
+            found[tid] = meta
+    return found, missing
+
+
+def load_persisted(missing: List[str], market: str) -> Tuple[Dict[str, Dict], List[str]]:
+    """메모리에 없던 ID를 DB에서 찾아 메모리 캐시를 채운다. (찾은 것, 여전히 없는 ID)"""
+    global _db_hits
+    if not TRACK_META_PERSIST or not missing:
+        return {}, missing
+    try:
+        found = metadata_store.get_tracks(missing, market, TRACK_META_DB_MAX_AGE)
+    except Exception as e:
+        print(f"[track_meta] DB 조회 실패: {e}")
+        return {}, missing
+    _db_hits += len(found)
+    store(found, market)
+    return found, [tid for tid in missing if tid not in found]
+
+
+def store(by_id: Dict[str, Dict], market: str) -> None:
+    """by_id: 요청한 트랙 ID -> 메타 (market 재연결로 응답 ID가 달라도 요청 ID 기준)"""
+    for tid, meta in by_id.items():
+        _cache.set((tid, market), meta)
+
+
+def persist(by_id: Dict[str, Dict], market: str, raw_tracks: List[Dict]) -> None:
+    """새로 받은 트랙과 그 아티스트를 DB에 upsert"""
+    if not TRACK_META_PERSIST or not by_id:
+        return
+    artists = {}
+    for t in raw_tracks:
+        for a in t.get("artists") or []:
+            if a and a.get("id") and a.get("name"):
+                artists[a["id"]] = a["name"]
+    try:
+        metadata_store.upsert_tracks(by_id, market)
+        metadata_store.upsert_artists(artists)
+    except Exception as e:
+        print(f"[track_meta] DB 저장 실패: {e}")
+
+
+def request_id(t: Dict) -> str:
+    return (t.get("linked_from") or {}).get("id") or t["id"]
+
+
+def ordered(track_ids: List[str], found: Dict[str, Dict]) -> List[Dict]:
+    """요청한 순서대로 정렬 (조회되지 않은 ID는 제외)"""
+    return [found[tid] for tid in track_ids if tid in found]
+
+
+def stats() -> dict:
+    return {**_cache.stats(), "db_hits": _db_hits, "persist": TRACK_META_PERSIST}
@@ -70,7 +70,11 @@ def refresh_access_token(refresh_token: str):
         print("[spotify] refresh error:", r.status_code, r.text[:500])
         r.raise_for_status()
     td = r.json()
-    return {"access_token": td["access_token"], "refresh_token": td.get("refresh_token")}
+    return {
+        "access_token": td["access_token"],
+        "refresh_token": td.get("refresh_token"),
+        "expires_in": td.get("expires_in", 3600)
+    }
 
 
 def get_me(access_token: str):